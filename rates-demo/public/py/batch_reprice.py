@@ -0,0 +1,122 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+from rateslib import from_json
+
+try:
+    from .swap_details import reprice_swaps, form_solver, decode_calibration_jacobian, align_jacobian
+except ImportError:  # loaded as a plain module next to swap_details.py (offline scripts, pool workers)
+    from swap_details import reprice_swaps, form_solver, decode_calibration_jacobian, align_jacobian
+
+
+MAIN_COLUMNS = ['ID', 'NPV', 'ParRate']
+
+# per-process pricing state, built once by _init_worker
+_worker: dict = {}
+
+
+def _init_worker(curve_json: str, calibration_md: pd.DataFrame, fixings: pd.Series = None, jacobian: bytes = None):
+    global _worker
+    curve = from_json(curve_json)
+    terms = list(calibration_md['Term'])
+    _worker = {
+        'curve': curve,
+        'valuation_date': curve.nodes.keys[0],
+        'fixings': fixings,
+        'solver': None if jacobian is not None else form_solver(curve_json, terms, calibration_md),
+        'jacobian': None if jacobian is None else align_jacobian(decode_calibration_jacobian(jacobian), terms),
+    }
+
+
+def _price_chunk(chunk_idx: int, swap_rows: pd.DataFrame) -> Tuple[int, pd.DataFrame]:
+    out = reprice_swaps(
+        swap_rows,
+        _worker['solver'],
+        _worker['valuation_date'],
+        fixings=_worker['fixings'],
+        curve=_worker['curve'],
+        jacobian=_worker['jacobian'],
+    )
+    return chunk_idx, out
+
+
+def split_main_risk(priced: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split reprice_swaps output into MainTbl (ID, NPV, ParRate) and RiskTbl (ID, R, c_*) frames."""
+    risk_cols = ['ID', 'R'] + [c for c in priced.columns if c.startswith('c_')]
+    return priced[MAIN_COLUMNS].reset_index(drop=True), priced[risk_cols].reset_index(drop=True)
+
+
+def iter_reprice_book(
+    swap_rows: pd.DataFrame,
+    curve_json: str,
+    calibration_md: pd.DataFrame,
+    chunk_size: int = 200,
+    processes: int = 1,
+    fixings: pd.Series = None,
+    jacobian: bytes = None,
+    progress: Callable[[int, int], None] = None,
+) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Exact reprice of a whole book, yielding (MainTbl, RiskTbl) chunks as
+    they complete. Each worker builds the Solver (or decodes ``jacobian``)
+    once; ``progress(done, total)`` is called after every chunk.
+
+    With ``processes <= 1`` everything runs in this process and chunks come
+    back in input order, so results are deterministic. With a pool, chunks
+    are yielded in completion order.
+    """
+    if chunk_size < 1:
+        raise ValueError("iter_reprice_book: chunk_size must be at least 1")
+    total = len(swap_rows)
+    chunks = [swap_rows.iloc[i:i + chunk_size] for i in range(0, total, chunk_size)]
+    done = 0
+    if processes <= 1:
+        _init_worker(curve_json, calibration_md, fixings, jacobian)
+        for i, chunk in enumerate(chunks):
+            _, priced = _price_chunk(i, chunk)
+            done += len(chunk)
+            if progress is not None:
+                progress(done, total)
+            yield split_main_risk(priced)
+        return
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        initializer=_init_worker,
+        initargs=(curve_json, calibration_md, fixings, jacobian),
+    ) as pool:
+        futures = {pool.submit(_price_chunk, i, chunk): len(chunk) for i, chunk in enumerate(chunks)}
+        for fut in as_completed(futures):
+            _, priced = fut.result()
+            done += futures[fut]
+            if progress is not None:
+                progress(done, total)
+            yield split_main_risk(priced)
+
+
+def reprice_book(
+    swap_rows: pd.DataFrame,
+    curve_json: str,
+    calibration_md: pd.DataFrame,
+    chunk_size: int = 200,
+    processes: int = 1,
+    fixings: pd.Series = None,
+    jacobian: bytes = None,
+    progress: Callable[[int, int], None] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Collect iter_reprice_book into full MainTbl/RiskTbl frames in input ID order."""
+    mains, risks = [], []
+    for main, risk in iter_reprice_book(
+        swap_rows, curve_json, calibration_md, chunk_size, processes, fixings, jacobian, progress
+    ):
+        mains.append(main)
+        risks.append(risk)
+    if not mains:
+        return pd.DataFrame(columns=MAIN_COLUMNS), pd.DataFrame(columns=['ID', 'R'])
+    order = pd.Index(swap_rows['ID'])
+    main = pd.concat(mains, ignore_index=True)
+    risk = pd.concat(risks, ignore_index=True)
+    main = main.iloc[np.argsort(order.get_indexer(main['ID']), kind='stable')].reset_index(drop=True)
+    risk = risk.iloc[np.argsort(order.get_indexer(risk['ID']), kind='stable')].reset_index(drop=True)
+    return main, risk
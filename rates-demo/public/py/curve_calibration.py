@@ -1,3 +1,9 @@
+import asyncio
+import inspect
+import json
+import struct
+import time
+
 import pandas as pd
 from pandas import DataFrame
 import numpy as np
@@ -7,9 +13,14 @@ import numpy as np
 # https://rateslib.com/py/en/2.0.x/z_swpm.html
 # Changes: adjusted inputs, renamed variables, simplified output.
 # rateslib is MIT Licensed: https://github.com/sonofeft/rateslib/blob/main/LICENSE
-from rateslib import add_tenor, dt, Curve, Solver, IRS, dcf, from_json
+from rateslib import add_tenor, dt, Curve, Solver, IRS, dcf, from_json, Dual, get_calendar
 from datetime import datetime, timedelta
 
+try:
+    from .lru import LRU
+except ImportError:  # loaded as a plain module next to lru.py (tests, offline scripts)
+    from lru import LRU
+
 valuation_date:datetime
 sofr: Curve | None = None  # to be set via set_curve_from_json
 sofr_json: str | None = None
@@ -20,39 +31,328 @@ def set_curve_from_json(json_str: str):
     """
     Initialize the global rateslib curve from stored calibration JSON.
     """
-    global sofr, sofr_json, valuation_date
+    global sofr, sofr_json, valuation_date, _cache_entry
     sofr = from_json(json_str)
+    # cached entries hold node values for the previous curve object
+    _curve_cache.clear()
+    _cache_entry = None
     valuation_date = sofr.nodes.keys[0]
     sofr_json = json_str
     return sofr
 
 
+class CalibrationSession:
+    """
+    Persistent calibration state for one curve object and valuation date.
+
+    The maturity schedule and IRS instruments are built once. Every solve
+    starts from the node values left by the previous one (the curve is
+    mutated in place), and the previous solve's dv/ds Jacobian is kept so a
+    small quote change is first tried as a single Newton step
+    v += (dv/ds)^T . ds, verified by repricing the instruments. Only if that
+    misses ``newton_tol`` (in percent) does a full Solver run, warm-started
+    from the Newton guess.
+    """
+
+    def __init__(self, curve: Curve, terms: list, newton_max_quotes: int = 1, newton_tol: float = 1e-5):
+        self.curve = curve
+        self.valuation_date = curve.nodes.keys[0]
+        maturities = {t: add_tenor(self.valuation_date, t, "F", "nyc") for t in terms}
+        self.terms = sorted(terms, key=lambda t: maturities[t])
+        self.maturities = [maturities[t] for t in self.terms]
+        self.instruments = [IRS(self.valuation_date, m, spec="usd_irs", curves="sofr") for m in self.maturities]
+        self.newton_max_quotes = newton_max_quotes
+        self.newton_tol = newton_tol
+        self.rates: np.ndarray | None = None  # last solved quotes, percent
+        self.grad_s_vT: np.ndarray | None = None
+        self.solves = 0
+        self.newton_steps = 0
+
+    def matches(self, curve: Curve, terms: list) -> bool:
+        return curve is self.curve and curve.nodes.keys[0] == self.valuation_date and set(terms) == set(self.terms)
+
+    def node_values(self) -> np.ndarray:
+        """Real values of the solver-controlled nodes (all but the first)."""
+        return np.array([float(self.curve[k].real) for k in self.curve.nodes.keys[1:]])
+
+    def set_node_values(self, values: np.ndarray):
+        for k, val in zip(self.curve.nodes.keys[1:], values):
+            old = self.curve[k]
+            # keep the node's AD variables and gradient so a later Solver still sees it as a parameter
+            new = Dual(float(val), list(old.vars), list(old.dual)) if isinstance(old, Dual) else float(val)
+            self.curve.update_node(k, new)
+
+    def restore(self, rates: np.ndarray, nodes: np.ndarray, grad_s_vT: np.ndarray):
+        """Put the curve back into a previously solved state without solving."""
+        self.set_node_values(nodes)
+        self.rates = np.asarray(rates, dtype="float64")
+        self.grad_s_vT = grad_s_vT
+
+    def _residuals(self) -> np.ndarray:
+        return np.array([float(inst.rate(curves=self.curve).real) for inst in self.instruments]) - self.rates
+
+    def _newton(self, rates: np.ndarray) -> bool:
+        ds = rates - self.rates
+        v = self.node_values()
+        self.set_node_values(v + self.grad_s_vT.T @ ds)
+        previous = self.rates
+        self.rates = rates
+        if np.max(np.abs(self._residuals())) <= self.newton_tol:
+            return True
+        self.rates = previous
+        return False
+
+    def _solve(self, rates: np.ndarray):
+        solver = Solver(
+            curves=[self.curve],
+            instruments=self.instruments,
+            s=rates,
+            instrument_labels=self.terms,
+            id="us_rates",
+        )
+        self.rates = rates
+        self.grad_s_vT = np.array(solver.grad_s_vT, dtype="float64")
+        self.solves += 1
+
+    def calibrate(self, rates: np.ndarray):
+        """Fit the curve to quotes (percent) ordered as ``self.terms``."""
+        rates = np.asarray(rates, dtype="float64")
+        if self.rates is not None and np.array_equal(rates, self.rates):
+            return
+        if self.grad_s_vT is not None:
+            moved = int(np.count_nonzero(rates != self.rates))
+            if moved <= self.newton_max_quotes and self._newton(rates):
+                self.newton_steps += 1
+                return
+        self._solve(rates)
+
+
+_session: CalibrationSession | None = None
+
+
+class CurveCache(LRU):
+    """
+    Bounded LRU of solved curves keyed by valuation date, terms and quotes
+    quantized to ``tolerance_bp``. Entries keep the curve JSON, the solved
+    node values and Jacobian (to restore the live curve without a Solver
+    run) and, once requested, the display curves.
+    """
+
+    def __init__(self, maxsize: int = 64, tolerance_bp: float = 0.01):
+        if maxsize < 1:
+            raise ValueError("CurveCache: maxsize must be at least 1")
+        if tolerance_bp <= 0:
+            raise ValueError("CurveCache: tolerance_bp must be positive")
+        super().__init__(int(maxsize))
+        self.tolerance_bp = float(tolerance_bp)
+
+    def key(self, valuation_date: datetime, terms: list, rates: np.ndarray) -> tuple:
+        """``rates`` in percent, ordered as ``terms``."""
+        steps = np.rint(np.asarray(rates, dtype="float64") * 100 / self.tolerance_bp).astype("int64")
+        return (valuation_date, tuple(terms), tuple(steps.tolist()))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "maxsize": self.maxsize,
+            "tolerance_bp": self.tolerance_bp,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_curve_cache = CurveCache()
+_cache_entry: dict | None = None  # entry matching the live curve, holds its display curves
+
+
+def set_curve_cache(maxsize: int = 64, tolerance_bp: float = 0.01):
+    """Replace the calibration cache (drops all entries and statistics)."""
+    global _curve_cache, _cache_entry
+    _curve_cache = CurveCache(maxsize, tolerance_bp)
+    _cache_entry = None
+
+
+def get_curve_cache_stats() -> dict:
+    return _curve_cache.stats()
+
+
 def calibrate_curve(data: DataFrame) -> str:
     """
     Calibrate the stored curve using market data rows [{Term, Rate}].
     Rates are expected in decimals (0.053 -> 5.3%).
     """
-    global sofr_json
+    global sofr_json, _session, _cache_entry
     df = data.copy()
     if not {"Term", "Rate"}.issubset(df.columns):
         raise ValueError("calibrate_curve: data must have Term and Rate columns")
     df["Rate"] = df["Rate"].astype(float)
     terms = list(df["Term"])
-    df['maturity'] = [add_tenor(valuation_date, t, "F", "nyc") for t in terms]
-    df = df.set_index('maturity').sort_index(ascending=True)
-    maturities = df.index
-    df = df.reset_index().set_index('Term')
-    Solver(
-        curves=[sofr],
-        instruments=[IRS(valuation_date, m, spec="usd_irs", curves="sofr") for m in maturities],
-        s=df["Rate"] * 100,  # rateslib expects percents
-        instrument_labels=df.index.tolist(),
-        id="us_rates",
-    )
-    sofr_json = sofr.to_json()
+    if _session is None or not _session.matches(sofr, terms):
+        _session = CalibrationSession(sofr, terms)
+    rates = df.set_index("Term").loc[_session.terms, "Rate"].to_numpy(dtype="float64") * 100  # rateslib expects percents
+    key = _curve_cache.key(valuation_date, _session.terms, rates)
+    entry = _curve_cache.get(key)
+    if entry is not None:
+        if entry is not _cache_entry:
+            _session.restore(entry["rates"], entry["nodes"], entry["grad_s_vT"])
+    else:
+        _session.calibrate(rates)
+        entry = _curve_cache.put(key, {
+            "rates": rates,
+            "nodes": _session.node_values(),
+            "grad_s_vT": _session.grad_s_vT,
+            "json": sofr.to_json(),
+            "curves": {},
+        })
+    _cache_entry = entry
+    sofr_json = entry["json"]
     return sofr_json
 
 
+_JACOBIAN_MAGIC = b"SBJ1"
+
+
+def get_calibration_jacobian() -> bytes:
+    """
+    The live calibration's node-to-quote Jacobian in a compact binary form:
+    magic ``SBJ1``, uint32 header length, a JSON header (curve id, node
+    dates, terms, shape) and then, as little-endian float64, dv/ds
+    (terms x free nodes, per 1% quote move) followed by its inverse ds/dv.
+    Decoded by ``swap_details.decode_calibration_jacobian``.
+    """
+    if _session is None or _session.grad_s_vT is None:
+        raise ValueError("get_calibration_jacobian: no calibration has run")
+    dv_ds = np.ascontiguousarray(_session.grad_s_vT, dtype="<f8")
+    ds_dv = np.ascontiguousarray(np.linalg.pinv(dv_ds), dtype="<f8")
+    header = json.dumps({
+        "curve": sofr.id,
+        "nodes": [k.isoformat() for k in sofr.nodes.keys],
+        "terms": list(_session.terms),
+        "shape": list(dv_ds.shape),
+    }).encode()
+    return _JACOBIAN_MAGIC + struct.pack("<I", len(header)) + header + dv_ds.tobytes() + ds_dv.tobytes()
+
+
+def _display_curve(name: str, build) -> pd.DataFrame:
+    # display curves are memoized on the cache entry of the live curve
+    if _cache_entry is None or sofr_json is not _cache_entry["json"]:
+        return build()
+    curves = _cache_entry["curves"]
+    if name not in curves:
+        curves[name] = build()
+    return curves[name].copy()
+
+
+class CalibrationScheduler:
+    """
+    Single-flight, latest-wins driver for ``calibrate``.
+
+    ``submit`` never queues: a snapshot arriving while a solve is in flight
+    replaces any pending one (counted as skipped). A running solve is never
+    cancelled; it always finishes and its result is published, then the
+    newest pending snapshot (if any) is solved next. At most one solve runs
+    at a time, including when ``calibrate`` is a coroutine function or an
+    ``executor`` is given. ``publish(result, data, latency)`` receives each
+    result and ``on_error(error, data)`` each failed solve; ``clock`` is
+    injectable so latency can be tested with a fake clock.
+
+    Before taking a snapshot the runner yields to the event loop once, so
+    submits queued behind a synchronous solve (e.g. worker messages) are
+    coalesced first.
+    """
+
+    def __init__(self, calibrate=None, publish=None, clock=time.perf_counter, executor=None, on_error=None):
+        self.calibrate = calibrate_curve if calibrate is None else calibrate
+        self.publish = publish
+        self.on_error = on_error
+        self.clock = clock
+        self.executor = executor
+        self._pending = None
+        self._has_pending = False
+        self._worker: asyncio.Task | None = None
+        self.submitted = 0
+        self.skipped = 0
+        self.published = 0
+        self.solves = 0
+        self.errors = 0
+        self.last_error: Exception | None = None
+        self.last_latency: float | None = None
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+        self.last_result = None
+
+    @property
+    def busy(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def submit(self, data):
+        """Offer the newest market snapshot; must be called from the event loop."""
+        self.submitted += 1
+        if self._has_pending:
+            self.skipped += 1
+        self._pending = data
+        self._has_pending = True
+        if not self.busy:
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def drain(self):
+        """Wait until every submitted snapshot is solved or coalesced."""
+        while self.busy:
+            await asyncio.shield(self._worker)
+
+    def _start(self, data) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if inspect.iscoroutinefunction(self.calibrate):
+            return loop.create_task(self.calibrate(data))
+        if self.executor is not None:
+            return loop.run_in_executor(self.executor, self.calibrate, data)
+        fut = loop.create_future()
+        try:
+            fut.set_result(self.calibrate(data))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+
+    async def _run(self):
+        while self._has_pending:
+            await asyncio.sleep(0)
+            data = self._pending
+            self._pending = None
+            self._has_pending = False
+            start = self.clock()
+            try:
+                result = await self._start(data)
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                if self.on_error is not None:
+                    self.on_error(e, data)
+                continue
+            latency = self.clock() - start
+            self.last_latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            self._total_latency += latency
+            self.solves += 1
+            self.last_result = result
+            self.published += 1
+            if self.publish is not None:
+                self.publish(result, data, latency)
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "skipped": self.skipped,
+            "published": self.published,
+            "errors": self.errors,
+            "last_latency": self.last_latency,
+            "mean_latency": self._total_latency / self.solves if self.solves else None,
+            "max_latency": self.max_latency,
+        }
+
+
 display_terms = [
     "1B",
     "2B",
@@ -72,40 +372,92 @@ display_terms = [
 ]
 
 
+_grids: dict = {}  # (valuation_date, terms) -> (dates, days), resolved once per date
+
+
+def tenor_grid(terms: list | None = None) -> tuple[list, np.ndarray]:
+    """Maturity dates and day offsets for ``terms`` (default ``display_terms``)."""
+    terms = tuple(display_terms if terms is None else terms)
+    key = (valuation_date, terms)
+    if key not in _grids:
+        dates = [add_tenor(valuation_date, t, "F", "nyc") for t in terms]
+        _grids[key] = (dates, np.array([(d - valuation_date).days for d in dates], dtype="int64"))
+    return _grids[key]
+
+
+def business_day_grid(horizon: str = "40Y") -> tuple[list, np.ndarray]:
+    """Every NYC business day from the valuation date out to ``horizon``."""
+    key = (valuation_date, ("bus", horizon))
+    if key not in _grids:
+        cal = get_calendar("nyc")
+        dates = list(cal.bus_date_range(valuation_date, add_tenor(valuation_date, horizon, "F", "nyc")))
+        _grids[key] = (dates, np.array([(d - valuation_date).days for d in dates], dtype="int64"))
+    return _grids[key]
+
+
+def _log_linear_dfs(days: np.ndarray) -> np.ndarray:
+    node_days = np.array([(k - valuation_date).days for k in sofr.nodes.keys], dtype="float64")
+    log_v = np.log([float(v.real) for v in sofr.nodes.values])
+    days = np.asarray(days, dtype="float64")
+    # segment index per date; dates past the last node extrapolate the final segment
+    j = np.clip(np.searchsorted(node_days, days, side="right") - 1, 0, len(node_days) - 2)
+    w = (days - node_days[j]) / (node_days[j + 1] - node_days[j])
+    return np.exp(log_v[j] + w * (log_v[j + 1] - log_v[j]))
+
+
+def _overnight_fractions(days: np.ndarray) -> np.ndarray | float:
+    # day count of [d - 1, d] in the curve's convention, as sofr.rate would use
+    convention = sofr.meta.convention
+    if str(convention).upper() == "ACT360":
+        return 1 / 360
+    base = valuation_date
+    return np.array([
+        dcf(base + timedelta(days=int(n) - 1), base + timedelta(days=int(n)), convention, calendar=sofr.meta.calendar)
+        for n in days
+    ])
+
+
+def sample_curve(dates: list | None = None, days: np.ndarray | None = None) -> pd.DataFrame:
+    """
+    Discount factors, zero rates (act360, percent) and overnight forwards
+    (percent, in the curve's convention) on a date grid, evaluated in one
+    pass. Pass ``dates`` or their day offsets from the valuation date;
+    defaults to the display tenors.
+    """
+    if days is None:
+        if dates is None:
+            dates, days = tenor_grid()
+        else:
+            days = np.array([(d - valuation_date).days for d in dates], dtype="int64")
+    days = np.asarray(days, dtype="int64")
+    if sofr.interpolator.local_name == "log_linear" and sofr.interpolator.spline is None:
+        dfs = _log_linear_dfs(days)
+        dfs_prev = _log_linear_dfs(days - 1)
+    else:
+        base = valuation_date
+        dfs = np.array([float(sofr[base + timedelta(days=int(n))].real) for n in days])
+        dfs_prev = np.array([float(sofr[base + timedelta(days=int(n) - 1)].real) for n in days])
+    t = days / 360.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zero = np.where(days > 0, -100 * np.log(dfs) / t, np.nan)
+    forward = (dfs_prev / dfs - 1) / _overnight_fractions(days) * 100
+    out = pd.DataFrame({"days": days, "df": dfs, "zero_rate": zero, "forward_rate": forward})
+    if dates is not None:
+        out.insert(0, "date", dates)
+    return out
+
+
+def _display_samples() -> pd.DataFrame:
+    return _display_curve("samples", lambda: sample_curve().assign(term=display_terms).set_index("term"))
+
+
 def get_discount_factor_curve() -> pd.DataFrame:
-    return pd.DataFrame(
-        columns=["df", "term"],
-        data=[
-            (float(sofr[add_tenor(valuation_date, t, "F", "nyc")]), t)
-            for t in display_terms
-        ],
-    ).set_index("term")
+    return _display_samples()[["df"]]
 
 
 def get_zero_rate_curve() -> pd.DataFrame:
-    return pd.DataFrame(
-        columns=["zero_rate", "term"],
-        data=[
-            (
-                100
-                * (
-                    np.log(sofr[add_tenor(valuation_date, t, "F", "nyc")].real)
-                    / -dcf(valuation_date, add_tenor(valuation_date, t, "F", "nyc"), "act360")
-                ),
-                t,
-            )
-            for t in display_terms
-        ],
-    ).set_index("term")
+    return _display_samples()[["zero_rate"]]
 
 
 def get_forward_rate_curve() -> pd.DataFrame:
-    maturities = [add_tenor(valuation_date, t, "F", "nyc") for t in display_terms]
-    forwards = [float(sofr.rate(m - timedelta(days=1), m)) for m in maturities]
-    days = [(m - valuation_date).days for m in maturities]
-    return pd.DataFrame(
-        columns=["forward_rate", "days", "term"],
-        data=[
-            (forwards[i], days[i], display_terms[i]) for i in range(len(display_terms))
-        ],
-    ).set_index("term")
+    return _display_samples()[["forward_rate", "days"]]
@@ -1,5 +1,9 @@
 # market_sim.py
 from __future__ import annotations
+import json
+import os
+import time
+from typing import Iterator
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
@@ -28,11 +32,166 @@ def _ordered(df: DataFrame) -> DataFrame:
 # ---- Mutable state ----
 _mut = None
 _terms: list[str] = []
+_term_pos: dict[str, int] = {}
 
 # persistent global factor to induce correlation across tenors/time
 _global_factor = 0.0
 _rng = np.random.default_rng()  # modern RNG
 
+# ---- Tick history ----
+class TickHistory:
+    """
+    Bounded ring buffer of tick events (timestamp, tenor index, new rate).
+
+    Events live in preallocated numpy arrays of fixed ``capacity``, so memory
+    never grows. A checkpoint curve holds the state just before the oldest
+    retained event; evicting an event folds it into the checkpoint, which
+    lets any retained step be reconstructed. Steps are numbered from 0 since
+    the history was (re)started.
+    """
+
+    def __init__(self, terms: list[str], rates: np.ndarray, capacity: int = 100_000):
+        self.terms = list(terms)
+        self.capacity = max(1, int(capacity))
+        self._checkpoint = np.array(rates, dtype="float64")
+        self._ts = np.zeros(self.capacity, dtype="float64")
+        self._tenor = np.zeros(self.capacity, dtype=np.int32)
+        self._rate = np.zeros(self.capacity, dtype="float64")
+        self._head = 0  # next write slot
+        self._count = 0
+        self._total = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def first_step(self) -> int:
+        return self._total - self._count
+
+    @property
+    def last_step(self) -> int:
+        return self._total - 1
+
+    def _order(self) -> np.ndarray:
+        # ring slots from oldest to newest
+        return (self._head - self._count + np.arange(self._count)) % self.capacity
+
+    def _fold(self, checkpoint: np.ndarray, tenors: np.ndarray, rates: np.ndarray):
+        # apply events (oldest first) to a curve: last event per tenor wins
+        if not len(tenors):
+            return
+        uniq, first = np.unique(tenors[::-1], return_index=True)
+        checkpoint[uniq] = rates[::-1][first]
+
+    def record(self, ts: float, tenor: int, rate: float):
+        h = self._head
+        if self._count == self.capacity:
+            self._checkpoint[self._tenor[h]] = self._rate[h]
+        else:
+            self._count += 1
+        self._ts[h] = ts
+        self._tenor[h] = tenor
+        self._rate[h] = rate
+        self._head = (h + 1) % self.capacity
+        self._total += 1
+
+    def record_many(self, ts, tenors, rates):
+        tenors = np.asarray(tenors, dtype=np.int32)
+        rates = np.asarray(rates, dtype="float64")
+        ts = np.broadcast_to(np.asarray(ts, dtype="float64"), tenors.shape)
+        k = len(tenors)
+        if not k:
+            return
+        evict = max(0, self._count + k - self.capacity)
+        if evict:
+            order = self._order()
+            old = order[:min(evict, self._count)]
+            self._fold(self._checkpoint, self._tenor[old], self._rate[old])
+            spill = evict - len(old)
+            if spill:
+                # more new events than capacity: the earliest never get stored
+                self._fold(self._checkpoint, tenors[:spill], rates[:spill])
+                ts, tenors, rates = ts[spill:], tenors[spill:], rates[spill:]
+            self._count -= len(old)
+        slots = (self._head + np.arange(len(tenors))) % self.capacity
+        self._ts[slots] = ts
+        self._tenor[slots] = tenors
+        self._rate[slots] = rates
+        self._head = int((self._head + len(tenors)) % self.capacity)
+        self._count += len(tenors)
+        self._total += k
+
+    def events(self, start: int | None = None, stop: int | None = None) -> np.ndarray:
+        """Retained events in [start, stop) as a structured (step, ts, tenor, rate) array."""
+        first = self.first_step
+        lo = max(first, first if start is None else int(start))
+        hi = min(self._total, self._total if stop is None else int(stop))
+        slots = self._order()[max(0, lo - first):max(0, hi - first)]
+        out = np.empty(len(slots), dtype=[("step", np.int64), ("ts", np.float64), ("tenor", np.int32), ("rate", np.float64)])
+        out["step"] = np.arange(lo, lo + len(slots))
+        out["ts"] = self._ts[slots]
+        out["tenor"] = self._tenor[slots]
+        out["rate"] = self._rate[slots]
+        return out
+
+    def snapshot(self, step: int) -> np.ndarray:
+        """Curve right after event ``step``; ``first_step - 1`` gives the checkpoint."""
+        step = int(step)
+        if step < self.first_step - 1 or step > self.last_step:
+            raise IndexError(f"TickHistory: step {step} not retained")
+        curve = self._checkpoint.copy()
+        slots = self._order()[:step - self.first_step + 1]
+        self._fold(curve, self._tenor[slots], self._rate[slots])
+        return curve
+
+    def changes(self) -> np.ndarray:
+        """Rate change of every retained event versus that tenor's previous value."""
+        slots = self._order()
+        tenors = self._tenor[slots]
+        rates = self._rate[slots]
+        prev = np.empty_like(rates)
+        by_tenor = np.argsort(tenors, kind="stable")
+        sorted_tenors = tenors[by_tenor]
+        sorted_rates = rates[by_tenor]
+        shifted = np.empty_like(sorted_rates)
+        shifted[1:] = sorted_rates[:-1]
+        group_start = np.ones(len(slots), dtype=bool)
+        group_start[1:] = sorted_tenors[1:] != sorted_tenors[:-1]
+        shifted[group_start] = self._checkpoint[sorted_tenors[group_start]]
+        prev[by_tenor] = shifted
+        return rates - prev
+
+    def realized_vol(self, window: float | None = None, last_n: int | None = None) -> np.ndarray:
+        """
+        Per-tenor realised volatility, sqrt(sum of squared changes), in rate units,
+        over events in the last ``window`` seconds and/or the last ``last_n`` events.
+        """
+        changes = self.changes()
+        slots = self._order()
+        keep = np.ones(len(slots), dtype=bool)
+        if window is not None and len(slots):
+            keep &= self._ts[slots] >= self._ts[slots[-1]] - float(window)
+        if last_n is not None:
+            keep[:max(0, len(slots) - int(last_n))] = False
+        sq = np.bincount(self._tenor[slots][keep], weights=changes[keep] ** 2, minlength=len(self.terms))
+        return np.sqrt(sq)
+
+    def replay(self, start: int | None = None, stop: int | None = None) -> Iterator[tuple[float, str, float, float]]:
+        """
+        Iterate (timestamp, term, rate, change) without any pacing, so it can
+        drive SwapRiskEngine.shift_term faster than real time.
+        """
+        ev = self.events(start, stop)
+        if not len(ev):
+            return
+        changes = self.changes()[ev["step"] - self.first_step]
+        terms = self.terms
+        for ts, tenor, rate, change in zip(ev["ts"].tolist(), ev["tenor"].tolist(), ev["rate"].tolist(), changes.tolist()):
+            yield ts, terms[tenor], rate, change
+
+_history: TickHistory | None = None
+_history_capacity = 100_000
+
 # ---- Public API ----
 def get_datafeed() -> DataFrame:
     """Return the current full mutated curve (all terms)."""
@@ -40,11 +199,41 @@ def get_datafeed() -> DataFrame:
     return _mut.copy()
 
 def reset_datafeed():
-    """Reset the curve to the original seed state."""
+    """Reset the curve to the original seed state (and a replay to its start)."""
     global _mut, _global_factor
     _ensure_initialized()
     _mut = _ordered(_source).drop(columns=["Years"])
     _global_factor = 0.0
+    if _replay is not None:
+        # the seed is the replay's start state, so the cursor goes back with it
+        _replay.seek(_replay_start)
+    _reset_history()
+
+def _reset_history():
+    global _history
+    _history = TickHistory(_terms, _mut["Rate"].to_numpy(dtype="float64"), _history_capacity)
+
+def get_tick_history() -> TickHistory:
+    _ensure_initialized()
+    return _history
+
+def set_history_capacity(capacity: int):
+    """Set the ring buffer size (events) and restart the history from the current curve."""
+    global _history_capacity
+    _history_capacity = max(1, int(capacity))
+    if _mut is not None:
+        _reset_history()
+
+def get_datafeed_at_step(step: int) -> DataFrame:
+    """Curve as it was right after tick ``step`` (must still be in the history)."""
+    _ensure_initialized()
+    return DataFrame({"Rate": _history.snapshot(step)}, index=pd.Index(_terms, name=_mut.index.name))
+
+def get_realized_vol(window: float | None = None, last_n: int | None = None) -> DataFrame:
+    """Per-tenor realised vol of the feed in basis points (see TickHistory.realized_vol)."""
+    _ensure_initialized()
+    vol = _history.realized_vol(window=window, last_n=last_n) * _bps_denom()
+    return DataFrame({"VolBps": vol}, index=pd.Index(_terms, name=_mut.index.name))
 
 def get_random_term() -> str:
     return _rng.choice(_terms)
@@ -120,7 +309,7 @@ def simulate_tick(
     # pick tenor index
     _ensure_initialized()
     label = term if term is not None else get_random_term()
-    i = _terms.index(label)
+    i = _term_pos[label]
 
     # update global factor (AR(1) mean-reverting random walk)
     _global_factor = (1.0 - mean_revert) * _global_factor + _rng.normal(0.0, 1.0)
@@ -140,14 +329,127 @@ def simulate_tick(
 
     # keep precision to reflect bps-level moves when using decimals
     _mut.iloc[i, 0] = round(new_rate, 6)
+    _history.record(time.time(), i, round(new_rate, 6))
     return label, new_rate
 
+def _ar1_path(shocks: np.ndarray, a: float, start: float) -> np.ndarray:
+    """x_t = a * x_{t-1} + shocks_t, vectorized blockwise as a^t * (x_0 + cumsum(a^-s * e_s))."""
+    out = np.empty_like(shocks)
+    if a <= 0.0 or not len(shocks):
+        out[:] = shocks
+        return out
+    # keep a^-block well inside float64 range
+    block = max(1, len(shocks) if a >= 1.0 else min(4096, int(230.0 / -np.log(a))))
+    powers = a ** np.arange(1, block + 1, dtype="float64")
+    x = float(start)
+    for lo in range(0, len(shocks), block):
+        e = shocks[lo:lo + block]
+        p = powers[:len(e)]
+        out[lo:lo + len(e)] = p * (x + np.cumsum(e / p))
+        x = float(out[lo + len(e) - 1])
+    return out
+
+def simulate_path(
+    n_steps: int,
+    rho: float = 0.9,
+    sigma_bps: float = 20.0,
+    mean_revert: float = 0.02,
+    margin_bps: float = 10.0,
+    terms: list[str] | None = None,
+    seed: int | None = None,
+    events: bool = False,
+    advance: bool = True,
+) -> np.ndarray:
+    """
+    Generate ``n_steps`` ticks in bulk with the same model as simulate_tick.
+
+    The random draws and the AR(1) global factor are computed on numpy arrays;
+    only the neighbour-band clipping, which depends on the curve left by the
+    previous tick, runs as a tight scalar loop.
+
+    Parameters
+    ----------
+    n_steps : number of ticks
+    rho, sigma_bps, mean_revert, margin_bps : as in simulate_tick
+    terms : optional tenor label per step; if None, pick randomly
+    seed : seed a private RNG for reproducible paths (module RNG otherwise)
+    events : return compact events instead of full curves
+    advance : leave the feed (curve and global factor) at the end of the path
+
+    Returns
+    -------
+    (n_steps x tenors) array of rates after each tick, tenors in feed order,
+    or with ``events`` a structured array of (step, tenor, rate).
+    """
+    global _global_factor
+
+    _ensure_initialized()
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    n_steps = int(n_steps)
+    n = len(_terms)
+    if n_steps <= 0:
+        if events:
+            return np.empty(0, dtype=[("step", np.int64), ("tenor", np.int32), ("rate", np.float64)])
+        return np.empty((0, n), dtype="float64")
+    if terms is None:
+        idx = rng.integers(0, n, size=n_steps)
+    else:
+        if len(terms) != n_steps:
+            raise ValueError("simulate_path: terms must have one label per step")
+        idx = np.fromiter((_term_pos[t] for t in terms), dtype=np.int64, count=n_steps)
+
+    factor = _ar1_path(rng.normal(0.0, 1.0, n_steps), 1.0 - mean_revert, _global_factor)
+    local = rng.normal(0.0, 1.0, n_steps)
+    sigma = sigma_bps / _bps_denom()
+    shocks = sigma * (rho * factor + np.sqrt(max(0.0, 1.0 - rho**2)) * local)
+
+    # clip to neighbor band ± margin, same rules as _neighbor_bounds
+    margin = margin_bps / _bps_denom()
+    initial = _mut["Rate"].to_numpy(dtype="float64", copy=True)
+    rates = initial.tolist()
+    new_rates = np.empty(n_steps, dtype="float64")
+    for step, (i, shock) in enumerate(zip(idx.tolist(), shocks.tolist())):
+        if n == 1:
+            lo, hi = rates[0], rates[0]
+        elif i == 0:
+            lo = hi = rates[1]
+        elif i == n - 1:
+            lo = hi = rates[n - 2]
+        else:
+            lo, hi = rates[i - 1], rates[i + 1]
+            if lo > hi:
+                lo, hi = hi, lo
+        new_rate = round(min(max(rates[i] + shock, lo - margin), hi + margin), 6)
+        rates[i] = new_rate
+        new_rates[step] = new_rate
+
+    if advance:
+        _mut.iloc[:, 0] = rates
+        _history.record_many(time.time(), idx, new_rates)
+        if n_steps:
+            _global_factor = float(factor[-1])
+
+    if events:
+        out = np.empty(n_steps, dtype=[("step", np.int64), ("tenor", np.int32), ("rate", np.float64)])
+        out["step"] = np.arange(n_steps)
+        out["tenor"] = idx
+        out["rate"] = new_rates
+        return out
+
+    # forward fill: each tenor holds the rate of its last event (or the start)
+    steps = np.arange(n_steps)
+    last = np.where(idx[:, None] == np.arange(n)[None, :], steps[:, None], -1)
+    np.maximum.accumulate(last, axis=0, out=last)
+    return np.where(last >= 0, new_rates[np.maximum(last, 0)], initial)
 def get_updated_datafeed() -> DataFrame:
     """
     Advance one tick and return a 'delta' view:
     same as the prior curve but with ONE term updated.
     """
-    label, _ = simulate_tick()
+    if _replay is not None:
+        _replay_tick()
+    else:
+        label, _ = simulate_tick()
     df = get_datafeed()
     # optional: to mimic your prior function that only differs in 1 row
     # (here we already mutated _mut; returning a copy is enough)
@@ -170,7 +472,8 @@ def set_source_from_rows(rows: list[dict]):
     Initialize the global curve from list of {'Term','Rate'} rows.
     Rates are expected in percent; we store decimals internally.
     """
-    global _source, _mut, _terms, _global_factor
+    global _source, _mut, _terms, _term_pos, _global_factor, _replay
+    _replay = None
     df = DataFrame(rows)
     if df.empty or "Term" not in df.columns or "Rate" not in df.columns:
         raise ValueError("set_source_from_rows: invalid data")
@@ -180,7 +483,171 @@ def set_source_from_rows(rows: list[dict]):
     ordered = _ordered(_source).drop(columns=["Years"])
     _mut = ordered.copy()
     _terms = _mut.index.to_list()
+    _term_pos = {t: i for i, t in enumerate(_terms)}
     _global_factor = 0.0
+    _reset_history()
+
+# ---- Historical replay ----
+# A history store is a directory of .npy columns sorted by (curve, quote_time):
+#   quote_time.npy int64 ns, tenor.npy int16, rate.npy float64 (percent, as in
+#   OneDimensionalMarketData), plus meta.json with the term and curve_id
+#   dictionaries and each curve's [start, stop) row range.
+_STORE_COLUMNS = ("quote_time", "tenor", "rate")
+
+def write_history_store(path: str, quotes: DataFrame):
+    """Write OneDimensionalMarketData rows (Term, Rate, quote_time, curve_id) as a history store."""
+    df = DataFrame(quotes)
+    if df.empty or not {"Term", "Rate", "quote_time", "curve_id"}.issubset(df.columns):
+        raise ValueError("write_history_store: need Term, Rate, quote_time and curve_id")
+    df = df.dropna(subset=["Rate"])
+    df = df.assign(quote_time=pd.to_datetime(df["quote_time"], utc=True).dt.tz_localize(None))
+    df = df.sort_values(["curve_id", "quote_time"], kind="stable")
+    tenor_codes, terms = pd.factorize(df["Term"])
+    curve_codes, curves = pd.factorize(df["curve_id"])
+    bounds = np.searchsorted(curve_codes, np.arange(len(curves) + 1))
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "quote_time.npy"), df["quote_time"].to_numpy(dtype="datetime64[ns]").astype(np.int64))
+    np.save(os.path.join(path, "tenor.npy"), tenor_codes.astype(np.int16))
+    np.save(os.path.join(path, "rate.npy"), df["Rate"].to_numpy(dtype="float64"))
+    meta = {
+        "terms": [str(t) for t in terms],
+        "curves": {str(c): [int(bounds[i]), int(bounds[i + 1])] for i, c in enumerate(curves)},
+    }
+    with open(os.path.join(path, "meta.json"), "w") as fh:
+        json.dump(meta, fh)
+
+class HistoricalQuoteSource:
+    """
+    Streams curve states for one curve_id out of a memory-mapped history store.
+
+    Only the pages touched by seeks (binary search on quote_time) and by the
+    quotes actually replayed are read, so years of data never sit in RAM.
+    Each state is the curve after applying every quote sharing the next
+    quote_time.
+    """
+
+    def __init__(self, path: str, curve_id: str | None = None):
+        with open(os.path.join(path, "meta.json")) as fh:
+            meta = json.load(fh)
+        self.terms: list[str] = meta["terms"]
+        curves = meta["curves"]
+        if curve_id is None:
+            if len(curves) != 1:
+                raise ValueError("HistoricalQuoteSource: store has several curves, pass curve_id")
+            curve_id = next(iter(curves))
+        lo, hi = curves[str(curve_id)]
+        self.curve_id = str(curve_id)
+        cols = {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r") for c in _STORE_COLUMNS}
+        self._time = cols["quote_time"][lo:hi]
+        self._tenor = cols["tenor"][lo:hi]
+        self._rate = cols["rate"][lo:hi]
+        self._pos = 0
+        self._rates = np.full(len(self.terms), np.nan)
+        self.time: pd.Timestamp | None = None
+
+    def __len__(self) -> int:
+        return len(self._time)
+
+    def __iter__(self):
+        while True:
+            state = self.next_state()
+            if state is None:
+                return
+            yield state
+
+    @property
+    def start_time(self) -> pd.Timestamp:
+        return pd.Timestamp(int(self._time[0]))
+
+    @property
+    def end_time(self) -> pd.Timestamp:
+        return pd.Timestamp(int(self._time[-1]))
+
+    def seek(self, when=None) -> np.ndarray:
+        """Position on the last state at or before ``when`` (first state if None); returns its rates."""
+        n = len(self._time)
+        if not n:
+            raise ValueError("HistoricalQuoteSource: no quotes for curve")
+        if when is None:
+            end = int(np.searchsorted(self._time, self._time[0], side="right"))
+        else:
+            end = int(np.searchsorted(self._time, pd.Timestamp(when).value, side="right"))
+        rates = np.full(len(self.terms), np.nan)
+        # walk back until every tenor has its latest quote
+        missing = len(self.terms)
+        hi = end
+        step = 4 * len(self.terms)
+        while missing and hi > 0:
+            lo = max(0, hi - step)
+            tenors = np.asarray(self._tenor[lo:hi])[::-1]
+            vals = np.asarray(self._rate[lo:hi])[::-1]
+            uniq, first = np.unique(tenors, return_index=True)
+            fresh = np.isnan(rates[uniq])
+            rates[uniq[fresh]] = vals[first[fresh]]
+            missing = int(np.isnan(rates).sum())
+            hi = lo
+            step *= 2
+        self._rates = rates
+        self._pos = end
+        self.time = pd.Timestamp(int(self._time[end - 1])) if end else None
+        return rates.copy()
+
+    def next_state(self) -> tuple[pd.Timestamp, np.ndarray, np.ndarray] | None:
+        """Advance to the next quote_time; returns (time, tenor codes moved, full rates) or None at the end."""
+        pos = self._pos
+        if pos >= len(self._time):
+            return None
+        t = self._time[pos]
+        end = int(np.searchsorted(self._time, t, side="right"))
+        tenors = np.asarray(self._tenor[pos:end])
+        self._rates[tenors] = self._rate[pos:end]
+        self._pos = end
+        self.time = pd.Timestamp(int(t))
+        return self.time, tenors, self._rates.copy()
+
+    def rows(self) -> list[dict]:
+        """Current state as [{Term, Rate}] in percent, the set_source_from_rows format."""
+        return [{"Term": t, "Rate": float(r)} for t, r in zip(self.terms, self._rates) if not np.isnan(r)]
+
+_replay: HistoricalQuoteSource | None = None
+_replay_map: np.ndarray | None = None
+_replay_start = None  # the ``start`` the replay was seeded at, for reset_datafeed
+
+def set_replay_source(path: str, curve_id: str | None = None, start=None) -> HistoricalQuoteSource:
+    """
+    Drive the feed from a history store instead of the simulator: seeds the
+    curve at ``start`` and makes get_updated_datafeed step through history.
+    """
+    global _replay, _replay_map, _replay_start
+    source = HistoricalQuoteSource(path, curve_id)
+    source.seek(start)
+    set_source_from_rows(source.rows())
+    # store tenor code -> feed position (-1 for tenors the feed does not carry)
+    _replay_map = np.array([_term_pos.get(t, -1) for t in source.terms], dtype=np.int64)
+    _replay = source
+    _replay_start = start
+    return source
+
+def clear_replay_source():
+    global _replay, _replay_map, _replay_start
+    _replay = None
+    _replay_map = None
+    _replay_start = None
+
+def _replay_tick() -> bool:
+    state = _replay.next_state()
+    if state is None:
+        return False
+    when, tenors, rates = state
+    pos = _replay_map[tenors]
+    keep = pos >= 0
+    pos = pos[keep]
+    new = rates[tenors[keep]] / 100.0
+    col = _mut.columns.get_loc("Rate")
+    for i, r in zip(pos.tolist(), new.tolist()):
+        _mut.iloc[i, col] = r
+    _history.record_many(when.timestamp(), pos, new)
+    return True
 
 def _ensure_initialized():
     if _source is None or _mut is None or not len(_terms):
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from typing import Callable
+
+
+class LRU:
+    """
+    Least-recently-used mapping over an OrderedDict with hit, miss and
+    eviction counts. ``get`` and ``put`` mark an entry as most recent;
+    ``put`` then trims the oldest entries while ``over_limit`` holds, but
+    never the entry just used. Subclasses can widen ``over_limit`` (e.g.
+    with a memory budget); ``on_evict(key, value)`` sees every eviction.
+    """
+
+    def __init__(self, maxsize: int | None = None, on_evict: Callable | None = None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        self.trim()
+        return value
+
+    def over_limit(self) -> bool:
+        return self.maxsize is not None and len(self._entries) > self.maxsize
+
+    def trim(self):
+        while len(self._entries) > 1 and self.over_limit():
+            key, value = self._entries.popitem(last=False)
+            self.evictions += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+
+    def pop(self, key, default=None):
+        return self._entries.pop(key, default)
+
+    def clear(self):
+        self._entries.clear()
+
+    def keys(self) -> list:
+        return list(self._entries.keys())
+
+    def values(self) -> list:
+        return list(self._entries.values())
@@ -1,6 +1,7 @@
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
-from typing import Optional
+from typing import Optional, Sequence
 
 
 
@@ -23,96 +24,1077 @@ def get_md_changes(
     return delta_pct.loc[allowed_terms].rename(columns={"Rate": "Change"})
 
 
-def aproximate_swap_quotes(swaps_df: DataFrame, risk_df: DataFrame, md_changes_df:DataFrame) -> DataFrame:
+# ---- Array entry points ----
+# Flat float64 buffers in and out, no pandas objects: anything exposing the
+# buffer protocol (numpy arrays, memoryviews of JS TypedArrays) is used
+# without copying. Risk matrices are (rows x terms) in c_* units, either 2D
+# or flattened row-major; the change vector is aligned to the same terms.
+#
+# Optional second order terms: a diagonal gamma (rows x terms, g_* columns,
+# NPV per bp^2) and/or a low rank cross gamma shared across the book,
+# Gamma_i = B diag(W_i) B^T with basis B (terms x k) and weights W (rows x k).
+
+_GAMMA_SCALE = 0.5 * 10_000 ** 2  # 1/2 (change in bp)^2
+
+def _as_vector(values) -> np.ndarray:
+    return np.asarray(values, dtype="float64").reshape(-1)
+
+
+def _as_matrix(values, rows: int, cols: int) -> np.ndarray:
+    return np.asarray(values, dtype="float64").reshape(rows, cols)
+
+
+def _term_risk_matrix(risk_df: DataFrame, term_cols: Sequence[str], prefix: str = "c_") -> np.ndarray:
+    # c_<term> (or g_<term>) columns in md order; tenors missing from the risk table carry no risk
+    cols = [f'{prefix}{t}' for t in term_cols]
+    return risk_df.reindex(columns=cols).fillna(0.0).to_numpy(dtype="float64")
+
+
+def gamma_pnl_arrays(changes, rows: int, gamma=None, gamma_basis=None, gamma_weights=None) -> np.ndarray:
+    """Second order term 1/2 dT.Gamma.d per row, from a diagonal and/or low rank cross gamma."""
+    changes = _as_vector(changes)
+    out = np.zeros(rows, dtype="float64")
+    if gamma is not None:
+        out += _as_matrix(gamma, rows, len(changes)) @ (changes * changes)
+    if gamma_basis is not None and gamma_weights is not None:
+        basis = _as_matrix(gamma_basis, len(changes), -1)
+        y = changes @ basis
+        out += _as_matrix(gamma_weights, rows, basis.shape[1]) @ (y * y)
+    out *= _GAMMA_SCALE
+    return out
+
+
+def approximate_npv_arrays(
+    npv,
+    risk,
+    changes,
+    out: Optional[np.ndarray] = None,
+    gamma=None,
+    gamma_basis=None,
+    gamma_weights=None,
+) -> np.ndarray:
+    """NPV + (risk @ changes) * 10_000 for swaps or counterparties, plus gamma terms if given."""
+    npv = _as_vector(npv)
+    changes = _as_vector(changes)
+    risk = _as_matrix(risk, len(npv), len(changes))
+    out = np.dot(risk, changes, out=out)
+    out *= 10_000
+    out += npv
+    if gamma is not None or gamma_weights is not None:
+        out += gamma_pnl_arrays(changes, len(npv), gamma, gamma_basis, gamma_weights)
+    return out
+
+
+def approximate_swap_arrays(
+    npv,
+    fixed_rate,
+    r,
+    risk,
+    changes,
+    out_npv: Optional[np.ndarray] = None,
+    out_par: Optional[np.ndarray] = None,
+    gamma=None,
+    gamma_basis=None,
+    gamma_weights=None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Array form of aproximate_swap_quotes; returns (NPV, ParRate)."""
+    new_npv = approximate_npv_arrays(npv, risk, changes, out_npv, gamma, gamma_basis, gamma_weights)
+    par = _par_rate(_as_vector(fixed_rate), new_npv, _as_vector(r), out=out_par)
+    return new_npv, par
+
+
+def approximate_cashflow_arrays(base_cf, risk, changes, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Array form of aproximate_counterparty_cashflows: base + (risk @ changes) * 100 per bucket."""
+    base_cf = _as_vector(base_cf)
+    changes = _as_vector(changes)
+    risk = _as_matrix(risk, len(base_cf), len(changes))
+    out = np.dot(risk, changes, out=out)
+    out *= 100
+    out += base_cf
+    return out
+
+
+def aproximate_swap_quotes(swaps_df: DataFrame, risk_df: DataFrame, md_changes_df:DataFrame, use_gamma: bool = False) -> DataFrame:
     term_cols = md_changes_df.index.tolist()
     if risk_df is None or risk_df.empty:
         return swaps_df
 
-    risk_df = risk_df.set_index("ID")
-    # Ensure all tenor columns exist
-    for col in term_cols:
-        if col not in risk_df.columns:
-            risk_df[col] = 0.0
     # Ensure risk vector rows align to swap ids
-    risk_df = risk_df.reindex(swaps_df["ID"]).fillna(0.0)
-    npvs = swaps_df["NPV"].to_numpy(dtype="float64")
-    risk = risk_df[[f'c_{i}' for i in list(term_cols)]].to_numpy(dtype="float64")
-    changes = md_changes_df.loc[term_cols, "Change"].to_numpy(dtype="float64")
-    new_npvs = npvs + (risk*10_000 @ changes)
+    risk_df = risk_df.set_index("ID").reindex(swaps_df["ID"])
+    new_npvs, par_rates = approximate_swap_arrays(
+        swaps_df["NPV"].to_numpy(dtype="float64"),
+        swaps_df["FixedRate"].to_numpy(dtype="float64"),
+        risk_df["R"].fillna(0.0).to_numpy(dtype="float64"),
+        _term_risk_matrix(risk_df, term_cols),
+        md_changes_df.loc[term_cols, "Change"].to_numpy(dtype="float64"),
+        gamma=_term_risk_matrix(risk_df, term_cols, "g_") if use_gamma else None,
+    )
     swaps_df["NPV"] = new_npvs
-    rates = swaps_df["FixedRate"].to_numpy(dtype="float64")
-    fixedraterisk = risk_df["R"].to_numpy(dtype="float64")
-    swaps_df["ParRate"] = rates + (new_npvs / fixedraterisk)/100
-
+    swaps_df["ParRate"] = par_rates
     return swaps_df
 
+def md_changes_vector(md_changes_df: DataFrame, terms: Sequence[str]) -> np.ndarray:
+    """Align a get_md_changes frame (Term index, Change column) to ``terms``; missing terms are 0."""
+    if md_changes_df is None or md_changes_df.empty:
+        return np.zeros(len(terms), dtype="float64")
+    return md_changes_df["Change"].reindex(list(terms)).fillna(0.0).to_numpy(dtype="float64", copy=True)
+
+
+def _par_rate(fixed_rate: np.ndarray, npv: np.ndarray, r: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    # ParRate = FixedRate + (NPV / R) / 100, same as aproximate_swap_quotes
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = np.divide(npv, r, out=out)
+    out /= 100.0
+    out += fixed_rate
+    return out
+
+
+class SwapRiskEngine:
+    """
+    Long-lived repricer for a book of swaps.
+
+    Swap IDs, base NPVs, fixed rates, ``R`` and the ``c_<term>`` risk matrix
+    are loaded once into contiguous float64 arrays (risk pre-scaled by 10_000),
+    so each tick only takes the market change vector aligned to ``terms`` and
+    does a single matvec. Rows can be added, removed and patched in place.
+
+    The engine also caches the current NPV/ParRate and the change vector they
+    were priced at, so single tenor ticks can be applied as a rank-1 update,
+    and the last values handed to the blotter, so only rows that moved need
+    to be published (see ``changed_rows`` and ``top_movers``).
+
+    Gamma mode is optional: ``set_gamma`` (diagonal, g_* units) and
+    ``set_cross_gamma`` (low rank, shared basis) add 1/2 dT.Gamma.d to every
+    reprice and incremental tick.
+
+    Drift is tracked per swap as ``error_scale * |change since anchor|^2``
+    (in bp), the anchor being the market the swap was last priced exactly at.
+    Swaps past a threshold are queued for an exact reprice (``RepriceQueue``)
+    and merged back with ``rebase_swaps`` while ticks keep flowing.
+    """
+
+    _ROW_ARRAYS = (
+        "_npv", "_fixed_rate", "_r", "_risk", "_cur_npv", "_cur_par", "_pub_npv", "_pub_par",
+        "_gamma", "_gamma_w", "_err_scale", "_anchor",
+    )
+
+    def __init__(self, terms: Sequence[str], capacity: int = 0):
+        self.terms: list[str] = [str(t) for t in terms]
+        self._term_pos = {t: i for i, t in enumerate(self.terms)}
+        self._ids: list = []
+        self._pos: dict = {}
+        self._n = 0
+        self._npv = np.empty(0, dtype="float64")
+        self._fixed_rate = np.empty(0, dtype="float64")
+        self._r = np.empty(0, dtype="float64")
+        self._risk = np.empty((0, len(self.terms)), dtype="float64")
+        self._cur_npv = np.empty(0, dtype="float64")
+        self._cur_par = np.empty(0, dtype="float64")
+        self._pub_npv = np.empty(0, dtype="float64")
+        self._pub_par = np.empty(0, dtype="float64")
+        self._changes = np.zeros(len(self.terms), dtype="float64")
+        # gamma storage is only allocated once gamma mode is switched on
+        self._gamma = None
+        self._gamma_w = None
+        self._gamma_basis = None
+        self._gamma_y = None
+        # drift tracking: per-row error scale and index into _anchors (0 = base calibration)
+        self._err_scale = np.empty(0, dtype="float64")
+        self._anchor = np.empty(0, dtype=np.intp)
+        self._anchors: list[np.ndarray] = [np.zeros(len(self.terms), dtype="float64")]
+        self._reserve(max(int(capacity), 16))
+
+    # ---- storage ----
+    def _reserve(self, capacity: int):
+        if capacity <= len(self._npv):
+            return
+        capacity = max(capacity, 2 * len(self._npv))
+        n = self._n
+        for name in self._ROW_ARRAYS:
+            old = getattr(self, name)
+            if old is None:
+                continue
+            arr = np.zeros((capacity, *old.shape[1:]), dtype=old.dtype)
+            arr[:n] = old[:n]
+            setattr(self, name, arr)
+
+    def _rows(self, values, k: int) -> np.ndarray:
+        arr = np.asarray(values, dtype="float64")
+        if arr.ndim == 0:
+            return np.full(k, float(arr))
+        arr = np.ascontiguousarray(arr)
+        if arr.shape[0] != k:
+            raise ValueError(f"SwapRiskEngine: expected {k} rows, got {arr.shape[0]}")
+        return arr
+
+    def _risk_rows(self, risk, k: int) -> np.ndarray:
+        arr = np.ascontiguousarray(risk, dtype="float64").reshape(k, -1)
+        if arr.shape[1] != len(self.terms):
+            raise ValueError(f"SwapRiskEngine: risk has {arr.shape[1]} tenors, expected {len(self.terms)}")
+        return arr
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __contains__(self, swap_id) -> bool:
+        return swap_id in self._pos
+
+    @property
+    def ids(self) -> list:
+        return list(self._ids)
+
+    @property
+    def npv(self) -> np.ndarray:
+        """Base NPVs (before any market change)."""
+        return self._npv[:self._n]
+
+    @property
+    def fixed_rate(self) -> np.ndarray:
+        return self._fixed_rate[:self._n]
+
+    @property
+    def r(self) -> np.ndarray:
+        return self._r[:self._n]
+
+    @property
+    def risk(self) -> np.ndarray:
+        """Risk matrix (swaps x terms) in NPV per unit rate change, i.e. c_* * 10_000."""
+        return self._risk[:self._n]
+
+    @property
+    def changes(self) -> np.ndarray:
+        """Market change vector the current NPV/ParRate are priced at."""
+        return self._changes.copy()
+
+    @property
+    def current_npv(self) -> np.ndarray:
+        return self._cur_npv[:self._n]
+
+    @property
+    def current_par_rate(self) -> np.ndarray:
+        return self._cur_par[:self._n]
+
+    def positions(self, ids: Sequence) -> np.ndarray:
+        return np.fromiter((self._pos[i] for i in ids), dtype=np.intp, count=len(ids))
+
+    def ids_at(self, idx) -> list:
+        return [self._ids[i] for i in np.asarray(idx, dtype=np.intp)]
+
+    # ---- loading / mutation ----
+    def load(self, ids: Sequence, npv, fixed_rate, r, risk, gamma=None) -> "SwapRiskEngine":
+        """Replace the whole book. ``risk`` is (swaps x terms) in c_* units."""
+        self._ids = []
+        self._pos = {}
+        self._n = 0
+        self._changes[:] = 0.0
+        self._anchors = self._anchors[:1]
+        if self._gamma_y is not None:
+            self._gamma_y[:] = 0.0
+        self.add_swaps(ids, npv, fixed_rate, r, risk, gamma=gamma)
+        return self
+
+    def add_swaps(self, ids: Sequence, npv, fixed_rate, r, risk, gamma=None, gamma_weights=None):
+        """Append swaps; IDs that are already loaded are patched instead."""
+        ids = list(ids)
+        k = len(ids)
+        if not k:
+            return
+        npv = self._rows(npv, k)
+        fixed_rate = self._rows(fixed_rate, k)
+        r = self._rows(r, k)
+        risk = self._risk_rows(risk, k)
+        if gamma is not None:
+            gamma = self._risk_rows(gamma, k)
+            self._enable_gamma()
+        if gamma_weights is not None:
+            if self._gamma_w is None:
+                raise ValueError("SwapRiskEngine: set_cross_gamma before adding gamma weights")
+            gamma_weights = self._rows(gamma_weights, k).reshape(k, self._gamma_w.shape[1])
+        known = np.array([i in self._pos for i in ids], dtype=bool)
+        if known.any():
+            idx = np.flatnonzero(known)
+            self.patch_swaps(
+                [ids[j] for j in idx],
+                npv=npv[idx],
+                fixed_rate=fixed_rate[idx],
+                r=r[idx],
+                risk=risk[idx],
+                gamma=None if gamma is None else gamma[idx],
+                gamma_weights=None if gamma_weights is None else gamma_weights[idx],
+            )
+        new = np.flatnonzero(~known)
+        if not len(new):
+            return
+        start, stop = self._n, self._n + len(new)
+        self._reserve(stop)
+        self._npv[start:stop] = npv[new]
+        self._fixed_rate[start:stop] = fixed_rate[new]
+        self._r[start:stop] = r[new]
+        np.multiply(risk[new], 10_000, out=self._risk[start:stop])
+        # slots past _n may hold rows left behind by remove_swaps
+        self._err_scale[start:stop] = np.nan
+        self._anchor[start:stop] = 0
+        if self._gamma is not None:
+            self._gamma[start:stop] = 0.0 if gamma is None else gamma[new] * _GAMMA_SCALE
+        if self._gamma_w is not None:
+            self._gamma_w[start:stop] = 0.0 if gamma_weights is None else gamma_weights[new] * _GAMMA_SCALE
+        self._refresh(slice(start, stop))
+        # never published yet, so always reported by changed_rows
+        self._pub_npv[start:stop] = np.nan
+        self._pub_par[start:stop] = np.nan
+        for j, swap_id in enumerate(ids[j] for j in new):
+            self._pos[swap_id] = start + j
+            self._ids.append(swap_id)
+        self._n = stop
+
+    def remove_swaps(self, ids: Sequence):
+        """Drop swaps by ID, filling each hole with the last row. Unknown IDs are ignored."""
+        for swap_id in ids:
+            i = self._pos.pop(swap_id, None)
+            if i is None:
+                continue
+            last = self._n - 1
+            if i != last:
+                moved = self._ids[last]
+                self._ids[i] = moved
+                self._pos[moved] = i
+                for name in self._ROW_ARRAYS:
+                    arr = getattr(self, name)
+                    if arr is not None:
+                        arr[i] = arr[last]
+            self._ids.pop()
+            self._n = last
+
+    def patch_swaps(self, ids: Sequence, npv=None, fixed_rate=None, r=None, risk=None, gamma=None, gamma_weights=None):
+        """Overwrite any of the stored fields for existing swaps."""
+        ids = list(ids)
+        k = len(ids)
+        if not k:
+            return
+        idx = self.positions(ids)
+        if npv is not None:
+            self._npv[idx] = self._rows(npv, k)
+        if fixed_rate is not None:
+            self._fixed_rate[idx] = self._rows(fixed_rate, k)
+        if r is not None:
+            self._r[idx] = self._rows(r, k)
+        if risk is not None:
+            self._risk[idx] = self._risk_rows(risk, k) * 10_000
+        if gamma is not None:
+            self._enable_gamma()
+            self._gamma[idx] = self._risk_rows(gamma, k) * _GAMMA_SCALE
+        if gamma_weights is not None:
+            if self._gamma_w is None:
+                raise ValueError("SwapRiskEngine: set_cross_gamma before patching gamma weights")
+            self._gamma_w[idx] = self._rows(gamma_weights, k).reshape(k, self._gamma_w.shape[1]) * _GAMMA_SCALE
+        self._refresh(idx)
+
+    # ---- gamma mode ----
+    @property
+    def gamma_enabled(self) -> bool:
+        return self._gamma is not None or self._gamma_w is not None
+
+    def _enable_gamma(self):
+        if self._gamma is None:
+            self._gamma = np.zeros((len(self._npv), len(self.terms)), dtype="float64")
+
+    def set_gamma(self, gamma, ids: Optional[Sequence] = None):
+        """Diagonal gamma rows (swaps x terms, NPV per bp^2) for ``ids``, or the whole book in order."""
+        self._enable_gamma()
+        if ids is None:
+            self._gamma[:self._n] = self._risk_rows(gamma, self._n) * _GAMMA_SCALE
+            self._refresh(slice(0, self._n))
+        else:
+            self.patch_swaps(ids, gamma=gamma)
+
+    def set_cross_gamma(self, basis, weights, ids: Optional[Sequence] = None):
+        """
+        Low rank cross gamma: Gamma_i = basis . diag(weights_i) . basis^T.
+
+        ``basis`` is (terms x k) and shared by the book, ``weights`` is
+        (swaps x k) for ``ids`` or the whole book in order. Changing the rank
+        resets every swap's weights.
+        """
+        basis = np.ascontiguousarray(basis, dtype="float64").reshape(len(self.terms), -1)
+        rank = basis.shape[1]
+        if self._gamma_w is None or self._gamma_w.shape[1] != rank:
+            self._gamma_w = np.zeros((len(self._npv), rank), dtype="float64")
+        self._gamma_basis = basis
+        self._gamma_y = self._changes @ basis
+        if ids is None:
+            self._gamma_w[:self._n] = _as_matrix(weights, self._n, rank) * _GAMMA_SCALE
+            self._refresh(slice(0, self._n))
+        else:
+            self.patch_swaps(ids, gamma_weights=weights)
+
+    def clear_gamma(self):
+        """Back to the first order approximation."""
+        self._gamma = None
+        self._gamma_w = None
+        self._gamma_basis = None
+        self._gamma_y = None
+        self._refresh(slice(0, self._n))
+
+    def _gamma_pnl(self, idx) -> Optional[np.ndarray]:
+        pnl = None
+        if self._gamma is not None:
+            pnl = self._gamma[idx] @ (self._changes * self._changes)
+        if self._gamma_w is not None:
+            cross = self._gamma_w[idx] @ (self._gamma_y * self._gamma_y)
+            pnl = cross if pnl is None else pnl + cross
+        return pnl
+
+    @classmethod
+    def from_frames(cls, swaps_df: DataFrame, risk_df: DataFrame, terms: Sequence[str]) -> "SwapRiskEngine":
+        """
+        Build from MainTbl/RiskTbl shaped frames, aligned the same way as
+        aproximate_swap_quotes. g_<term> columns, if present, switch on gamma mode.
+        """
+        engine = cls(terms, capacity=len(swaps_df))
+        ids = swaps_df["ID"].tolist()
+        cols = [f"c_{t}" for t in engine.terms]
+        if risk_df is None or risk_df.empty:
+            risk_df = DataFrame(columns=["ID", "R", *cols])
+        gamma_cols = [f"g_{t}" for t in engine.terms]
+        has_gamma = any(c in risk_df.columns for c in gamma_cols)
+        risk_df = risk_df.set_index("ID").reindex(columns=["R", *cols, *gamma_cols]).reindex(ids).fillna(0.0)
+        engine.load(
+            ids,
+            swaps_df["NPV"].to_numpy(dtype="float64"),
+            swaps_df["FixedRate"].to_numpy(dtype="float64"),
+            risk_df["R"].to_numpy(dtype="float64"),
+            risk_df[cols].to_numpy(dtype="float64"),
+            gamma=risk_df[gamma_cols].to_numpy(dtype="float64") if has_gamma else None,
+        )
+        return engine
+
+    # ---- pricing ----
+    def changes_vector(self, md_changes_df: DataFrame) -> np.ndarray:
+        return md_changes_vector(md_changes_df, self.terms)
+
+    def _refresh(self, idx):
+        # reprice a subset of rows at the cached change vector
+        npv = self._npv[idx] + self._risk[idx] @ self._changes
+        gamma_pnl = self._gamma_pnl(idx)
+        if gamma_pnl is not None:
+            npv += gamma_pnl
+        self._cur_npv[idx] = npv
+        self._cur_par[idx] = _par_rate(self._fixed_rate[idx], npv, self._r[idx])
+
+    def reprice(self, changes) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return (NPV, ParRate) for a market change vector aligned to ``terms``.
+
+        The returned arrays are views on internal buffers and are overwritten
+        by the next call; copy them if they need to outlive the tick.
+        """
+        n = self._n
+        changes = np.asarray(changes, dtype="float64")
+        if changes.shape != self._changes.shape:
+            raise ValueError(f"SwapRiskEngine: expected {len(self.terms)} changes, got {changes.size}")
+        self._changes[:] = changes
+        if self._gamma_basis is not None:
+            self._gamma_y = self._changes @ self._gamma_basis
+        npv = self._cur_npv[:n]
+        np.dot(self._risk[:n], self._changes, out=npv)
+        npv += self._npv[:n]
+        gamma_pnl = self._gamma_pnl(slice(0, n))
+        if gamma_pnl is not None:
+            npv += gamma_pnl
+        par = _par_rate(self._fixed_rate[:n], npv, self._r[:n], out=self._cur_par[:n])
+        return npv, par
+
+    def resync(self) -> tuple[np.ndarray, np.ndarray]:
+        """Full reprice at the cached change vector, dropping any rank-1 rounding drift."""
+        return self.reprice(self._changes.copy())
+
+    def shift_term(self, term: str, delta: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Incremental tick: move one tenor by ``delta`` (same units as Change).
+
+        Updates the cached NPVs with that one risk column times ``delta`` and
+        recomputes ParRate, O(swaps) instead of O(swaps x terms). In gamma mode
+        the diagonal term moves by g_j * delta * (2 * change_j + delta) and the
+        cross term by its O(swaps x rank) projection update. Returns the same
+        buffers as ``reprice``.
+        """
+        n = self._n
+        j = self._term_pos.get(term)
+        if j is None:
+            raise KeyError(f"SwapRiskEngine: unknown term {term}")
+        delta = float(delta)
+        before = self._changes[j]
+        self._changes[j] += delta
+        npv = self._cur_npv[:n]
+        if delta != 0.0:
+            npv += self._risk[:n, j] * delta
+            if self._gamma is not None:
+                npv += self._gamma[:n, j] * (delta * (2.0 * before + delta))
+            if self._gamma_w is not None:
+                y_new = self._gamma_y + delta * self._gamma_basis[j]
+                npv += self._gamma_w[:n] @ (y_new * y_new - self._gamma_y * self._gamma_y)
+                self._gamma_y = y_new
+        par = _par_rate(self._fixed_rate[:n], npv, self._r[:n], out=self._cur_par[:n])
+        return npv, par
+
+    def set_term_change(self, term: str, change: float) -> tuple[np.ndarray, np.ndarray]:
+        """Incremental tick given the tenor's total change since base (as from get_md_changes)."""
+        j = self._term_pos.get(term)
+        if j is None:
+            raise KeyError(f"SwapRiskEngine: unknown term {term}")
+        return self.shift_term(term, float(change) - self._changes[j])
+
+    # ---- drift / exact reprice fallback ----
+    def set_error_scale(self, scale, ids: Optional[Sequence] = None):
+        """Error proxy per swap in NPV per bp^2 of market move; NaN falls back to the gamma proxy."""
+        if ids is None:
+            self._err_scale[:self._n] = self._rows(scale, self._n)
+        else:
+            self._err_scale[self.positions(ids)] = self._rows(scale, len(ids))
+
+    def calibrate_error_scale(self, ids: Sequence, exact_npv):
+        """Set the error proxy of sampled swaps from exact reprices at the current market."""
+        idx = self.positions(ids)
+        dist = self._anchor_distance()[idx]
+        err = np.abs(self._rows(exact_npv, len(idx)) - self._cur_npv[idx])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._err_scale[idx] = np.where(dist > 0, err / dist, np.nan)
+
+    def _anchor_distance(self) -> np.ndarray:
+        # |change since anchor|^2 in bp^2, computed once per distinct anchor
+        anchors = np.vstack(self._anchors)
+        dist = (((self._changes - anchors) * 10_000) ** 2).sum(axis=1)
+        return dist[self._anchor[:self._n]]
+
+    def drift_errors(self) -> np.ndarray:
+        """
+        Estimated absolute NPV error per swap since it was last priced exactly.
+
+        Swaps without a calibrated error scale fall back to a second order
+        bound from gamma: 1/2 (max|g| + sum_k |w_k| |b_k|^2) per bp^2, which
+        covers both the diagonal and the low rank cross terms.
+        """
+        n = self._n
+        scale = self._err_scale[:n].copy()
+        missing = np.isnan(scale)
+        if missing.any():
+            proxy = np.zeros(int(missing.sum()), dtype="float64")
+            if self._gamma is not None:
+                proxy += np.abs(self._gamma[:n][missing]).max(axis=1)
+            if self._gamma_w is not None:
+                # |d.B diag(w) B^T.d| <= sum_k |w_k| |b_k|^2 |d|^2
+                proxy += np.abs(self._gamma_w[:n][missing]) @ (self._gamma_basis ** 2).sum(axis=0)
+            scale[missing] = proxy / _GAMMA_SCALE * 0.5
+        return scale * self._anchor_distance()
+
+    def drifted(self, threshold: float) -> np.ndarray:
+        """Positions whose estimated error exceeds ``threshold``, worst first."""
+        err = self.drift_errors()
+        idx = np.flatnonzero(err > threshold)
+        return idx[np.argsort(err[idx])[::-1]]
+
+    def rebase_swaps(self, ids: Sequence, npv, risk, at_changes, fixed_rate=None, r=None):
+        """
+        Merge exact reprices (NPV and c_* risk priced at market ``at_changes``).
+
+        Base NPV and risk are re-expressed around ``at_changes`` so the engine
+        returns the exact NPV there and expands from it with the fresh deltas
+        (gamma terms included), whatever the market has done since.
+        """
+        ids = list(ids)
+        k = len(ids)
+        if not k:
+            return
+        # swaps removed while their reprice was queued are dropped from every per-row input
+        keep = np.fromiter((i in self._pos for i in ids), dtype=bool, count=k)
+        exact = self._rows(npv, k)[keep]
+        risk_eff = self._risk_rows(risk, k)[keep] * 10_000
+        fixed_rate = None if fixed_rate is None else self._rows(fixed_rate, k)[keep]
+        r = None if r is None else self._rows(r, k)[keep]
+        ids = [i for i, ok in zip(ids, keep) if ok]
+        if not ids:
+            return
+        idx = self.positions(ids)
+        at = np.asarray(at_changes, dtype="float64").reshape(-1)
+        base = exact - risk_eff @ at
+        if self._gamma is not None:
+            g = self._gamma[idx]
+            base += g @ (at * at)
+            risk_eff -= 2.0 * g * at
+        if self._gamma_w is not None:
+            y_at = at @ self._gamma_basis
+            w = self._gamma_w[idx]
+            base += w @ (y_at * y_at)
+            risk_eff -= 2.0 * (w * y_at) @ self._gamma_basis.T
+        self._npv[idx] = base
+        self._risk[idx] = risk_eff
+        if fixed_rate is not None:
+            self._fixed_rate[idx] = fixed_rate
+        if r is not None:
+            self._r[idx] = r
+        self._anchors.append(at.copy())
+        self._anchor[idx] = len(self._anchors) - 1
+        self._compact_anchors()
+        self._refresh(idx)
+
+    def _compact_anchors(self):
+        if len(self._anchors) <= 64:
+            return
+        used, inverse = np.unique(self._anchor[:self._n], return_inverse=True)
+        keep = [0] + [int(a) for a in used if a != 0]
+        remap = {a: i for i, a in enumerate(keep)}
+        self._anchors = [self._anchors[a] for a in keep]
+        self._anchor[:self._n] = np.array([remap[int(a)] for a in used], dtype=np.intp)[inverse]
+
+    # ---- publishing ----
+    def mark_published(self, idx=None):
+        """Record the current values as published, for all rows or the given positions."""
+        n = self._n
+        if idx is None:
+            idx = slice(0, n)
+        self._pub_npv[idx] = self._cur_npv[idx]
+        self._pub_par[idx] = self._cur_par[idx]
+
+    def _publish(self, idx: np.ndarray, mark: bool) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        npv = self._cur_npv[idx]
+        par = self._cur_par[idx]
+        if mark:
+            self._pub_npv[idx] = npv
+            self._pub_par[idx] = par
+        return idx, npv, par
+
+    def changed_rows(
+        self,
+        npv_tol: float = 0.005,
+        par_tol: float = 5e-7,
+        mark: bool = True,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rows whose NPV or ParRate moved by more than the tolerance since last published.
+
+        Returns (positions, NPV, ParRate); map positions to IDs with ``ids_at``.
+        Rows never published are always included. With ``mark`` the returned
+        values become the new published state.
+        """
+        n = self._n
+        cur_par, pub_par = self._cur_par[:n], self._pub_par[:n]
+        with np.errstate(invalid="ignore"):
+            npv_move = np.abs(self._cur_npv[:n] - self._pub_npv[:n])
+            par_move = np.abs(cur_par - pub_par)
+        # unpublished rows have a NaN published NPV
+        moved = np.isnan(npv_move) | (npv_move > npv_tol) | (par_move > par_tol)
+        # ParRate is NaN/inf when R == 0; only count it if it actually changed
+        both_nan = np.isnan(cur_par) & np.isnan(pub_par)
+        moved |= np.isnan(par_move) & (cur_par != pub_par) & ~both_nan
+        return self._publish(np.flatnonzero(moved), mark)
+
+    def top_movers(self, k: int, mark: bool = True) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The ``k`` rows with the largest absolute NPV move since last published, largest first."""
+        n = self._n
+        k = max(0, min(int(k), n))
+        move = np.abs(self._cur_npv[:n] - self._pub_npv[:n])
+        move = np.where(np.isnan(move), np.inf, move)
+        if k == 0:
+            idx = np.empty(0, dtype=np.intp)
+        else:
+            idx = np.argpartition(move, n - k)[n - k:]
+            idx = idx[np.argsort(move[idx])[::-1]]
+        return self._publish(idx, mark)
+
+
+class RepriceQueue:
+    """
+    Swap IDs waiting for an exact rateslib reprice, oldest first.
+
+    IDs handed out by ``pop_batch`` stay in flight until ``done`` so a swap
+    that keeps drifting is not queued twice while it is being repriced.
+    """
+
+    def __init__(self, batch_size: int = 32):
+        self.batch_size = int(batch_size)
+        self._pending: dict = {}
+        self._in_flight: set = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def push(self, ids: Sequence) -> int:
+        added = 0
+        for swap_id in ids:
+            if swap_id not in self._pending and swap_id not in self._in_flight:
+                self._pending[swap_id] = None
+                added += 1
+        return added
+
+    def pop_batch(self, size: Optional[int] = None) -> list:
+        size = self.batch_size if size is None else int(size)
+        batch = []
+        for swap_id in list(self._pending)[:size]:
+            del self._pending[swap_id]
+            self._in_flight.add(swap_id)
+            batch.append(swap_id)
+        return batch
+
+    def done(self, ids: Sequence):
+        self._in_flight.difference_update(ids)
+
+    def discard(self, ids: Sequence):
+        for swap_id in ids:
+            self._pending.pop(swap_id, None)
+            self._in_flight.discard(swap_id)
+
+
+def service_reprice_queue(engine: SwapRiskEngine, queue: RepriceQueue, reprice, threshold: float) -> int:
+    """
+    One slice of the exact reprice fallback, meant to run between ticks.
+
+    Queues swaps whose drift estimate exceeds ``threshold``, pops one batch
+    and calls ``reprice(ids)``, which must return RiskTbl shaped rows (ID,
+    NPV, R, c_*; e.g. swap_details.reprice_swaps with the shared Solver
+    calibrated to the engine's current market). Results are merged with
+    ``rebase_swaps`` at the change vector the batch was priced at. Returns
+    the number of swaps merged.
+    """
+    queue.push(engine.ids_at(engine.drifted(threshold)))
+    ids = queue.pop_batch()
+    if not ids:
+        return 0
+    at_changes = engine.changes
+    try:
+        rows = reprice(ids)
+    finally:
+        queue.done(ids)
+    if rows is None or rows.empty:
+        return 0
+    risk = _term_risk_matrix(rows, engine.terms)
+    engine.rebase_swaps(
+        rows["ID"].tolist(),
+        rows["NPV"].to_numpy(dtype="float64"),
+        risk,
+        at_changes,
+        r=rows["R"].to_numpy(dtype="float64") if "R" in rows.columns else None,
+    )
+    return len(rows)
+
+
 def aproximate_counterparty_npv(npv: float, risk_df: DataFrame, md_changes_df:DataFrame) -> float:
     term_cols = md_changes_df.index.tolist()
     if risk_df is None or risk_df.empty:
         return npv
 
-    for col in term_cols:
-        if col not in risk_df.columns:
-            risk_df[col] = 0.0
-    risk = risk_df[[f'c_{i}' for i in list(term_cols)]].to_numpy(dtype="float64")
+    risk = _term_risk_matrix(risk_df, term_cols)
     changes = md_changes_df.loc[term_cols, "Change"].to_numpy(dtype="float64")
-    new_npv = npv + (risk*10_000 @ changes)
-    return new_npv
+    return approximate_npv_arrays(np.full(len(risk), npv), risk, changes)
 
 
-def aproximate_counterparty_cashflows(cf_df: DataFrame, cf_risk_df: DataFrame, md_changes_df:DataFrame) -> DataFrame:
-    if cf_df is None or cf_df.empty:
-        return cf_df
 
+def aproximate_counterparty_npvs(npvs, risk_df: DataFrame, md_changes_df: DataFrame, use_gamma: bool = False) -> DataFrame:
+    """
+    Shock every counterparty at once.
+
+    ``risk_df`` is the RiskAgg shape (ID plus c_* columns, one row per
+    counterparty) and ``npvs`` the base NPVs, either a Series keyed by ID or
+    an array aligned to the risk rows. Returns [ID, NPV] from a single matvec.
+    With ``use_gamma`` the g_* columns add the diagonal second order term.
+    """
+    if risk_df is None or risk_df.empty:
+        return DataFrame(columns=["ID", "NPV"])
+    ids = risk_df["ID"]
+    if isinstance(npvs, pd.Series):
+        base = npvs.reindex(ids.to_numpy()).fillna(0.0).to_numpy(dtype="float64")
+    else:
+        base = np.asarray(npvs, dtype="float64")
     term_cols = md_changes_df.index.tolist()
-    if cf_risk_df is None or cf_risk_df.empty or not term_cols:
-        return cf_df
+    risk = _term_risk_matrix(risk_df, term_cols)
+    changes = md_changes_df.loc[term_cols, "Change"].to_numpy(dtype="float64")
+    gamma = _term_risk_matrix(risk_df, term_cols, "g_") if use_gamma else None
+    new_npvs = approximate_npv_arrays(base, risk, changes, gamma=gamma)
+    return DataFrame({"ID": ids.to_numpy(), "NPV": new_npvs})
+
 
-    risk_df = cf_risk_df.copy()
-    # Ensure all tenor columns exist
-    for col in term_cols:
-        key = f'c_{col}'
-        if key not in risk_df.columns:
-            risk_df[key] = 0.0
+def rollup_counterparty_npv(counterparty_ids: Sequence, npvs) -> DataFrame:
+    """Grouped sum of swap level NPVs up to counterparties, returned as [ID, NPV]."""
+    codes, uniques = pd.factorize(np.asarray(counterparty_ids))
+    totals = np.bincount(codes, weights=np.asarray(npvs, dtype="float64"), minlength=len(uniques))
+    return DataFrame({"ID": uniques, "NPV": totals})
+
+_BASE_CASHFLOW_COLUMNS = ["TotalCashflow", "cashflow", "totalCashflow", "baseCashflow"]
+
+
+def _prepare_cashflow_buckets(cf_df: DataFrame, cf_risk_df: DataFrame, term_cols: Sequence[str]):
+    """
+    Resolve the key column and align CashflowRiskTbl rows onto CashflowTbl rows.
+
+    Returns (cf_df, key_col, risk_matrix, base_cf) with the risk matrix dense
+    (buckets x terms), or None when the frames cannot be aligned.
+    """
+    if cf_df is None or cf_df.empty:
+        return None
+    if cf_risk_df is None or cf_risk_df.empty or not len(term_cols):
+        return None
 
     key_col = None
     for candidate in ["bucket", "Bucket", "PaymentDate"]:
-        if candidate in cf_df.columns and candidate in risk_df.columns:
+        if candidate in cf_df.columns and candidate in cf_risk_df.columns:
             key_col = candidate
             break
     if key_col is None:
-        return cf_df
+        return None
 
-    risk_df = risk_df.rename(columns={"Bucket": "bucket"})
-    cf_df = cf_df.copy()
+    risk_df = cf_risk_df.rename(columns={"Bucket": "bucket"})
     cf_df = cf_df.rename(columns={"Bucket": "bucket"})
     key_col = "bucket" if key_col.lower() == "bucket" else key_col
 
     # Align risk rows to cashflow rows
     risk_df = risk_df.set_index(key_col)
-    ordered_risk = risk_df.reindex(cf_df[key_col]).fillna(0.0)
-    risk_matrix = ordered_risk[[f'c_{col}' for col in term_cols]].to_numpy(dtype="float64")
-    changes = md_changes_df.loc[term_cols, "Change"].to_numpy(dtype="float64")
-    deltas = (risk_matrix ) @ changes*100
+    ordered_risk = risk_df.reindex(cf_df[key_col])
+    risk_matrix = _term_risk_matrix(ordered_risk, term_cols)
 
     # Base cashflow per row
-    base_cf = cf_df.get("TotalCashflow")
-    if base_cf is None:
-        base_cf = cf_df.get("cashflow")
-    if base_cf is None:
-        base_cf = cf_df.get("totalCashflow")
-    if base_cf is None:
-        base_cf = cf_df.get("baseCashflow")
+    base_cf = None
+    for col in _BASE_CASHFLOW_COLUMNS:
+        if col in cf_df.columns:
+            base_cf = cf_df[col]
+            break
     if base_cf is None:
-        base_cf = 0.0
-    base_cf = pd.Series(base_cf).fillna(0.0).to_numpy(dtype="float64")
+        base_cf = np.zeros(len(cf_df), dtype="float64")
+    else:
+        base_cf = base_cf.fillna(0.0).to_numpy(dtype="float64")
+    return cf_df, key_col, risk_matrix, base_cf
+
 
-    new_cf = base_cf + deltas
+def aproximate_counterparty_cashflows(cf_df: DataFrame, cf_risk_df: DataFrame, md_changes_df:DataFrame) -> DataFrame:
+    term_cols = md_changes_df.index.tolist()
+    prepared = _prepare_cashflow_buckets(cf_df, cf_risk_df, term_cols)
+    if prepared is None:
+        return cf_df
+    cf_df, _, risk_matrix, base_cf = prepared
+    cf_df = cf_df.copy()
+    changes = md_changes_df.loc[term_cols, "Change"].to_numpy(dtype="float64")
+    new_cf = approximate_cashflow_arrays(base_cf, risk_matrix, changes)
     cf_df["TotalCashflow"] = new_cf
     cf_df["cashflow"] = new_cf
     return cf_df
 
 
+class CashflowBucketIndex:
+    """
+    Precompiled cashflow ladders for many counterparties.
+
+    ``prepare`` resolves the key column and aligns CashflowRiskTbl rows to the
+    CashflowTbl payment buckets once per counterparty, storing a dense
+    bucket x tenor matrix and the base cashflow vector. A tick is then a
+    matvec plus an add, and all counterparties are stacked so the ladder for
+    the whole book is a single matvec and a grouped sum.
+    """
+
+    def __init__(self, terms: Sequence[str]):
+        self.terms: list[str] = [str(t) for t in terms]
+        self._entries: dict = {}
+        self._stacked = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, counterparty_id) -> bool:
+        return counterparty_id in self._entries
+
+    def prepare(self, counterparty_id, cf_df: DataFrame, cf_risk_df: DataFrame) -> bool:
+        """Index one counterparty's cashflows; returns False (and drops it) if they cannot be aligned."""
+        prepared = _prepare_cashflow_buckets(cf_df, cf_risk_df, self.terms)
+        self._stacked = None
+        if prepared is None:
+            self._entries.pop(counterparty_id, None)
+            return False
+        frame, key_col, risk_matrix, base_cf = prepared
+        self._entries[counterparty_id] = {
+            "frame": frame,
+            "key_col": key_col,
+            "keys": frame[key_col].to_numpy(),
+            "risk": np.ascontiguousarray(risk_matrix * 100),
+            "base": base_cf,
+        }
+        return True
+
+    def remove(self, counterparty_id):
+        if self._entries.pop(counterparty_id, None) is not None:
+            self._stacked = None
+
+    def cashflows(self, counterparty_id, changes) -> np.ndarray:
+        """Shocked cashflow vector for one counterparty, in its CashflowTbl row order."""
+        entry = self._entries[counterparty_id]
+        return entry["base"] + entry["risk"] @ np.asarray(changes, dtype="float64")
+
+    def frame(self, counterparty_id, changes) -> DataFrame:
+        """Same output as aproximate_counterparty_cashflows for an indexed counterparty."""
+        entry = self._entries[counterparty_id]
+        new_cf = self.cashflows(counterparty_id, changes)
+        out = entry["frame"].copy()
+        out["TotalCashflow"] = new_cf
+        out["cashflow"] = new_cf
+        return out
+
+    def _stack(self):
+        if self._stacked is None:
+            ids = list(self._entries)
+            entries = [self._entries[i] for i in ids]
+            offsets = np.cumsum([0] + [len(e["base"]) for e in entries])
+            if entries:
+                risk = np.vstack([e["risk"] for e in entries])
+                base = np.concatenate([e["base"] for e in entries])
+                codes, keys = pd.factorize(np.concatenate([e["keys"] for e in entries]), sort=True)
+            else:
+                risk = np.empty((0, len(self.terms)), dtype="float64")
+                base = np.empty(0, dtype="float64")
+                codes, keys = np.empty(0, dtype=np.intp), np.empty(0)
+            self._stacked = {"ids": ids, "offsets": offsets, "risk": risk, "base": base, "codes": codes, "keys": keys}
+        return self._stacked
+
+    def reprice_all(self, changes) -> dict:
+        """Shocked cashflow vectors for every indexed counterparty from one matvec."""
+        st = self._stack()
+        flows = st["base"] + st["risk"] @ np.asarray(changes, dtype="float64")
+        offsets = st["offsets"]
+        return {cp: flows[offsets[i]:offsets[i + 1]] for i, cp in enumerate(st["ids"])}
+
+    def ladder(self, changes) -> DataFrame:
+        """Book level cashflow ladder: shocked cashflows summed per bucket across counterparties."""
+        st = self._stack()
+        flows = st["base"] + st["risk"] @ np.asarray(changes, dtype="float64")
+        totals = np.bincount(st["codes"], weights=flows, minlength=len(st["keys"]))
+        return DataFrame({"bucket": st["keys"], "cashflow": totals})
+
+
+# ---- Monte Carlo scenarios / VaR ----
+
+def _psd_factor(cov: np.ndarray) -> np.ndarray:
+    # symmetric square root factor, tolerant of the PSD (not PD) matrices sample covariances give
+    w, v = np.linalg.eigh((cov + cov.T) / 2.0)
+    return v * np.sqrt(np.clip(w, 0.0, None))
+
+
+class CurveScenarioGenerator:
+    """
+    Correlated curve change scenarios: rows of per-tenor rate changes in the
+    same units as get_md_changes (decimals), drawn from N(0, cov) in batches.
+    """
+
+    def __init__(self, terms: Sequence[str], cov, seed: Optional[int] = None):
+        self.terms: list[str] = [str(t) for t in terms]
+        self.cov = np.asarray(cov, dtype="float64").reshape(len(self.terms), len(self.terms))
+        self._factor = _psd_factor(self.cov)
+        self._rng = np.random.default_rng(seed)
+
+    @classmethod
+    def from_vols(cls, terms: Sequence[str], vols, corr=None, seed: Optional[int] = None) -> "CurveScenarioGenerator":
+        """Covariance from per-tenor vols (rate units over the horizon) and a correlation matrix (identity if None)."""
+        vols = _as_vector(vols)
+        corr = np.eye(len(vols)) if corr is None else np.asarray(corr, dtype="float64")
+        return cls(terms, corr * np.outer(vols, vols), seed)
+
+    @classmethod
+    def from_ticks(
+        cls,
+        terms: Sequence[str],
+        tenors,
+        changes,
+        events_per_sample: Optional[int] = None,
+        horizon: float = 1.0,
+        seed: Optional[int] = None,
+    ) -> "CurveScenarioGenerator":
+        """
+        Covariance estimated from single-tenor tick events (e.g. datafeed.TickHistory
+        ``events()["tenor"]`` and ``changes()``): consecutive events are summed per
+        tenor into samples of ``events_per_sample`` ticks, and the sample covariance
+        is scaled by ``horizon`` (samples per scenario horizon).
+        """
+        n = len(terms)
+        tenors = np.asarray(tenors, dtype=np.int64)
+        changes = _as_vector(changes)
+        per = int(events_per_sample or 4 * n)
+        samples = len(tenors) // per
+        if samples < 2:
+            raise ValueError("CurveScenarioGenerator.from_ticks: not enough ticks for a covariance")
+        used = samples * per
+        block = np.arange(used) // per
+        sums = np.bincount(block * n + tenors[:used], weights=changes[:used], minlength=samples * n)
+        cov = np.cov(sums.reshape(samples, n), rowvar=False) * float(horizon)
+        return cls(terms, cov, seed)
+
+    def draw(self, n: int) -> np.ndarray:
+        """(n x terms) scenario matrix."""
+        z = self._rng.standard_normal((int(n), len(self.terms)))
+        return z @ self._factor.T
+
+
+def _tail_update(tail: Optional[np.ndarray], losses: np.ndarray, m: int) -> np.ndarray:
+    # keep the m largest losses per row (rows x m)
+    merged = losses if tail is None else np.concatenate([tail, losses], axis=1)
+    if merged.shape[1] <= m:
+        return merged
+    return np.partition(merged, merged.shape[1] - m, axis=1)[:, -m:]
+
+
+def portfolio_var(
+    generator: CurveScenarioGenerator,
+    n_scenarios: int,
+    swap_risk,
+    counterparty_risk: Optional[DataFrame] = None,
+    confidence: float = 0.99,
+    chunk_size: int = 5_000,
+) -> dict:
+    """
+    Scenario VaR and expected shortfall per swap, per counterparty and for the book.
+
+    ``swap_risk`` is a RiskTbl frame (ID plus c_* columns) or a SwapRiskEngine;
+    ``counterparty_risk`` a RiskAgg frame. Each chunk of scenarios goes through
+    all risk rows (swaps, counterparties, book total) as one matrix-matrix
+    product; only the worst (1 - confidence) tail of losses is kept per row,
+    so memory is bounded by rows x tail rather than rows x scenarios.
+    Returns {"swaps", "counterparties", "book"} frames of [ID, VaR, ES]
+    with losses reported as positive numbers.
+    """
+    terms = generator.terms
+    if isinstance(swap_risk, SwapRiskEngine):
+        if swap_risk.terms != terms:
+            raise ValueError("portfolio_var: engine terms differ from the scenario terms")
+        swap_ids = swap_risk.ids
+        swap_matrix = swap_risk.risk
+    else:
+        swap_ids = swap_risk["ID"].tolist()
+        swap_matrix = _term_risk_matrix(swap_risk, terms) * 10_000
+    blocks = [swap_matrix, swap_matrix.sum(axis=0, keepdims=True)]
+    cp_ids = []
+    if counterparty_risk is not None and not counterparty_risk.empty:
+        cp_ids = counterparty_risk["ID"].tolist()
+        blocks.append(_term_risk_matrix(counterparty_risk, terms) * 10_000)
+    risk = np.ascontiguousarray(np.vstack(blocks).T)  # terms x rows
+
+    n_scenarios = int(n_scenarios)
+    m = max(1, int(np.ceil((1.0 - confidence) * n_scenarios)))
+    tail = None
+    done = 0
+    while done < n_scenarios:
+        k = min(int(chunk_size), n_scenarios - done)
+        losses = -(generator.draw(k) @ risk)  # k x rows
+        tail = _tail_update(tail, losses.T, m)
+        done += k
+
+    tail = np.sort(tail, axis=1)
+    var = tail[:, 0]
+    es = tail.mean(axis=1)
+    n_swaps = len(swap_ids)
+
+    def frame(ids, sl):
+        return DataFrame({"ID": ids, "VaR": var[sl], "ES": es[sl]})
+
+    return {
+        "swaps": frame(swap_ids, slice(0, n_swaps)),
+        "book": frame(["BOOK"], slice(n_swaps, n_swaps + 1)),
+        "counterparties": frame(cp_ids, slice(n_swaps + 1, None)),
+    }
+
+
 def log_cfs(cf_df: DataFrame, cf_risk_df: DataFrame, md_changes_df:DataFrame) -> DataFrame:
     return cf_risk_df
     #     return cf_df
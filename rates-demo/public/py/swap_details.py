@@ -1,8 +1,14 @@
-from rateslib import from_json, dt, IRS, Solver, add_tenor, Curve,LineCurve,get_calendar, defaults, Dual, FloatPeriod, NoInput
+from rateslib import from_json, dt, IRS, Solver, add_tenor, Curve,LineCurve,get_calendar, defaults, Dual, FloatPeriod, NoInput, gradient
 import pandas as pd
+import json
+import struct
 from typing import Dict, List, Union, Tuple
 import numpy as np
 from datetime import datetime
+try:
+    from .lru import LRU
+except ImportError:  # loaded as a plain module next to lru.py (tests, offline scripts)
+    from lru import LRU
 
 
 swap_context: Dict = {}
@@ -17,14 +23,87 @@ def _to_naive(ts_val):
             continue
     return ts
 
-def build_swap(row: pd.Series) -> IRS:
+_calendars: Dict = {}
+def _spec_calendar(spec: str = 'usd_irs'):
+    if spec not in _calendars:
+        _calendars[spec] = get_calendar(defaults.spec[spec]['calendar'])
+    return _calendars[spec]
+
+class SwapCache:
+    """
+    Bounded LRUs of built IRS objects keyed by trade economics
+    (StartDate, TerminationDate, spec, notional, fixed rate, valuation date),
+    one per fixings token. The few most recently used fixings sets keep
+    their own LRU, so alternating between them (blotter reprice vs details
+    view) does not rebuild every swap.
+    """
+    def __init__(self, maxsize: int = 512, max_fixings: int = 4):
+        if maxsize < 1:
+            raise ValueError("SwapCache: maxsize must be at least 1")
+        if max_fixings < 1:
+            raise ValueError("SwapCache: max_fixings must be at least 1")
+        self.maxsize = maxsize
+        self.max_fixings = max_fixings
+        self._by_token = LRU(max_fixings, on_evict=self._drop_fixings)  # fixings token -> LRU of swaps
+        self._entries = self._by_token.put(None, LRU(maxsize))
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    def _drop_fixings(self, token, entries: LRU):
+        if len(entries):
+            self.invalidations += 1
+    def sync_fixings(self, token):
+        entries = self._by_token.get(token)
+        if entries is None:
+            entries = self._by_token.put(token, LRU(self.maxsize))
+        self._entries = entries
+    def get(self, key) -> IRS:
+        swp = self._entries.get(key)
+        if swp is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return swp
+    def put(self, key, swp: IRS) -> IRS:
+        return self._entries.put(key, swp)
+    def clear(self):
+        for entries in self._by_token.values():
+            entries.clear()
+    def stats(self) -> Dict:
+        return {'size': sum(len(e) for e in self._by_token.values()), 'maxsize': self.maxsize, 'fixings_sets': len(self._by_token), 'max_fixings': self.max_fixings, 'hits': self.hits, 'misses': self.misses, 'invalidations': self.invalidations}
+
+swap_cache = SwapCache()
+_fixings_memo: Tuple = (None, None)  # (series, token) of the last fingerprinted fixings
+
+def _fixings_token(fixings: pd.Series):
+    # content fingerprint, so a fresh but identical series does not flush the cache
+    global _fixings_memo
+    if fixings.empty:
+        return None
+    if _fixings_memo[0] is fixings:
+        return _fixings_memo[1]
+    token = (len(fixings), fixings.index[0], fixings.index[-1], int(pd.util.hash_pandas_object(fixings).sum()))
+    _fixings_memo = (fixings, token)
+    return token
+
+def build_swap(row: pd.Series, valuation_date: datetime = None, fixings: pd.Series = None) -> IRS:
     global swap_context
-    valuation_date = swap_context['valuation_date']
-    cal = get_calendar(defaults.spec['usd_irs']['calendar'])
-    fixings = swap_context.get('fixings', pd.Series(dtype=float))  # should be a series indexed by date
+    if valuation_date is None:
+        valuation_date = swap_context['valuation_date']
+    spec = 'usd_irs'
+    if fixings is None:
+        fixings = swap_context.get('fixings', pd.Series(dtype=float))  # should be a series indexed by date
     if isinstance(fixings, pd.DataFrame):
         fixings = fixings.squeeze()
+    token = _fixings_token(fixings)
+    swap_cache.sync_fixings(token)
+    # the fixings slice depends on the valuation date, so it is only part of the key when fixings exist
+    key = (row['StartDate'], row['TerminationDate'], spec, float(row['Notional']), float(row['FixedRate']), valuation_date if token is not None else None)
+    swp = swap_cache.get(key)
+    if swp is not None:
+        return swp
     if not fixings.empty:
+        cal = _spec_calendar(spec)
         fixings = fixings.loc[cal.bus_date_range(fixings.index.min(), cal.add_bus_days(valuation_date, -1, True))]
     kwargs = {"leg2_fixings": fixings} if not fixings.empty else {}
     swp =IRS(
@@ -32,35 +111,120 @@ def build_swap(row: pd.Series) -> IRS:
             row['TerminationDate'],
             notional=row['Notional'],
             fixed_rate=row['FixedRate'],
-            spec="usd_irs",
+            spec=spec,
             curves="sofr",
             **kwargs
         )
-    return swp
+    return swap_cache.put(key, swp)
 
 
 #variables to set for a swap id on init, must be in scope for all calculations within the swap details modal
 
-def set_swap_context(swap_row:pd.Series,curve_json:str,calibration_md:pd.DataFrame):
+_curve_version = 0
+_CURVE_STATE_KEYS = ('curve_json', 'curve', 'curve_version', 'valuation_date', 'calibration_md', 'md_index', 'solver', 'jacobian', 'curve_risk', 'shocked_curves')
+_CURVE_STATE_LIMIT = 2
+_curve_states = LRU(_CURVE_STATE_LIMIT)  # shared by every swap context priced off the same curve
+
+def _curve_state(curve_json:str,calibration_md:pd.DataFrame,jacobian:bytes=None)->Dict:
+    # one curve, Solver/jacobian and curve risk per curve version, reused across swap contexts
+    global _curve_version
+    key = (curve_json, tuple(calibration_md['Term']), tuple(calibration_md['Rate'].astype(float)), None if jacobian is None else bytes(jacobian))
+    state = _curve_states.get(key)
+    if state is not None:
+        return state
+    curve = from_json(curve_json)
+    _curve_version += 1
+    state = {
+        'curve_json': curve_json,
+        'curve': curve,
+        # stamps everything derived from the curve (fixings tables, shocked rows, hydrated flows)
+        'curve_version': _curve_version,
+        'valuation_date': _to_naive(curve.nodes.keys[0]),
+        'calibration_md': calibration_md,
+        'md_index': _md_index(calibration_md),
+    }
+    _set_context_risk_source(jacobian, state)
+    set_curve_deltas(state)
+    state['shocked_curves'] = ShockedCurveProvider(curve, state['curve_risk'])
+    return _curve_states.put(key, state)
+
+def _use_curve_state(state:Dict):
+    swap_context.update({k: state[k] for k in _CURVE_STATE_KEYS})
+
+_CONTEXT_OVERHEAD_BYTES = 64 * 1024  # rough allowance for the IRS object and bookkeeping
+
+def _context_nbytes(value) -> int:
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True)
+        return int(usage.sum()) if isinstance(value, pd.DataFrame) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(_context_nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(_context_nbytes(v) for v in value)
+    return 0
+
+class SwapContextStore(LRU):
+    """
+    LRU of per-swap contexts keyed by swap ID, bounded by count and by an
+    estimated memory budget. Curve-level state is shared, so only the
+    swap's own rows, flows and sensitivities count towards the budget.
+    The most recently used (selected) context is never evicted.
+    """
+    def __init__(self, max_contexts: int = 8, memory_budget: int = 32 * 1024 * 1024):
+        if max_contexts < 1:
+            raise ValueError("SwapContextStore: max_contexts must be at least 1")
+        super().__init__(max_contexts)
+        self.max_contexts = max_contexts
+        self.memory_budget = memory_budget
+    def measure(self, ctx: Dict) -> int:
+        """Re-estimate a context's footprint; sizes are cached because measuring frames is slow."""
+        ctx['nbytes'] = _CONTEXT_OVERHEAD_BYTES + _context_nbytes({k: v for k, v in ctx.items() if k not in _CURVE_STATE_KEYS})
+        return ctx['nbytes']
+    def nbytes(self) -> int:
+        return sum(c.get('nbytes', _CONTEXT_OVERHEAD_BYTES) for c in self.values())
+    def over_limit(self) -> bool:
+        return super().over_limit() or self.nbytes() > self.memory_budget
+    def discard(self, key):
+        self.pop(key)
+    def stats(self) -> Dict:
+        return {'contexts': len(self), 'max_contexts': self.max_contexts, 'nbytes': self.nbytes(), 'memory_budget': self.memory_budget, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+context_store = SwapContextStore()
+
+def _same_economics(a: pd.Series, b: pd.Series) -> bool:
+    return all(a.get(k) == b.get(k) for k in ('StartDate', 'TerminationDate', 'Notional', 'FixedRate'))
+
+def set_swap_context(swap_row:pd.Series,curve_json:str,calibration_md:pd.DataFrame,jacobian:bytes=None):
+    # selects (or creates) the stored context for this swap; flipping back to a recent swap reuses its built state
     global swap_context
-    swap_context = {}
     # Normalize dates to naive datetimes (rateslib expects tz-naive)
     if 'StartDate' in swap_row:
         swap_row['StartDate'] = _to_naive(swap_row['StartDate'])
     if 'TerminationDate' in swap_row:
         swap_row['TerminationDate'] = _to_naive(swap_row['TerminationDate'])
-    swap_context['swap_row'] = swap_row
-    swap_context['curve_json'] = curve_json
-    swap_context['curve']= from_json(curve_json)
-    swap_context['valuation_date'] = _to_naive(swap_context['curve'].nodes.keys[0])
-    swap_context['calibration_md'] = calibration_md
-    swap_context['fixings'] = pd.Series(dtype=float)
-    swap_context['solver'] = form_solver(
-        swap_context['curve_json'],
-        list(calibration_md['Term']),
-        calibration_md
-    )
-    set_curve_deltas()
+    state = _curve_state(curve_json, calibration_md, jacobian)
+    key = swap_row.get('ID')
+    ctx = context_store.get(key)
+    if ctx is None or not _same_economics(ctx['swap_row'], swap_row):
+        ctx = {'swap_row': swap_row, 'fixings': pd.Series(dtype=float)}
+    swap_context = ctx
+    _use_curve_state(state)
+    context_store.put(key, ctx)
+def select_swap_context(swap_id) -> bool:
+    """Make a stored context current on the current curve, revaluing it if it was priced off an older one; False if it was evicted."""
+    global swap_context
+    ctx = context_store.get(swap_id)
+    if ctx is None:
+        return False
+    current = swap_context
+    swap_context = ctx
+    if current is not ctx and current.get('curve_version') is not None:
+        _use_curve_state(current)
+    if ctx.get('swap') is not None:
+        hydrate_swap()
+    return True
 def get_swap_fixing_index_name():
     return 'sofr' # TODO TIE TO rateslib defaults, get that from swap row (convert SOFR to usd_irs spec)
 def get_inclusive_fixings_date_bounds():
@@ -112,12 +276,92 @@ def form_solver(sofr_curve_json:str,terms:List[str],calibration_market_data:pd.D
     id="sofr",
     )
     return solver
+def decode_calibration_jacobian(blob: bytes) -> dict:
+    """
+    Unpack ``curve_calibration.get_calibration_jacobian`` output into
+    {curve, nodes, terms, vars, dv_ds, ds_dv}. dv_ds is terms x free nodes, per 1%.
+    """
+    blob = bytes(blob)
+    if blob[:4] != b"SBJ1":
+        raise ValueError("decode_calibration_jacobian: not a calibration jacobian")
+    (n,) = struct.unpack_from("<I", blob, 4)
+    header = json.loads(blob[8:8 + n].decode())
+    rows, cols = header["shape"]
+    arrays = np.frombuffer(blob, dtype="<f8", offset=8 + n).astype("float64")
+    return {
+        'curve': header['curve'],
+        'nodes': [datetime.fromisoformat(d) for d in header['nodes']],
+        'terms': header['terms'],
+        'vars': [f"{header['curve']}{i}" for i in range(1, len(header['nodes']))],
+        'dv_ds': arrays[:rows * cols].reshape(rows, cols),
+        'ds_dv': arrays[rows * cols:].reshape(cols, rows),
+    }
+def align_jacobian(jacobian: dict, terms: List[str]) -> dict:
+    """Reorder the quote axis of a decoded jacobian to ``terms``."""
+    if sorted(terms) != sorted(jacobian['terms']):
+        raise ValueError("align_jacobian: terms do not match the calibration")
+    pos = [jacobian['terms'].index(t) for t in terms]
+    return {**jacobian, 'terms': list(terms), 'dv_ds': jacobian['dv_ds'][pos], 'ds_dv': jacobian['ds_dv'][:, pos]}
+def solver_jacobian(solver: Solver, curve: Curve, terms: List[str]) -> dict:
+    """The same jacobian dict as decode_calibration_jacobian, read off a solved Solver."""
+    dv_ds = np.array(solver.grad_s_vT, dtype='float64')
+    return {
+        'curve': curve.id,
+        'nodes': list(curve.nodes.keys),
+        'terms': list(terms),
+        'vars': list(solver.variables),
+        'dv_ds': dv_ds,
+        'ds_dv': np.linalg.pinv(dv_ds),
+    }
+def jacobian_delta(values: List[Dual], jacobian: dict) -> np.ndarray:
+    """
+    Market-quote risk (per bp, one row per value) of curve-node duals: node
+    gradients are gathered in one pass and mapped with a single product with
+    the calibration jacobian, no per-value Solver.delta.
+    """
+    node_vars = jacobian['vars']
+    grads = np.array([gradient(v, node_vars) if isinstance(v, Dual) else np.zeros(len(node_vars)) for v in values]).reshape(len(values), len(node_vars))
+    return grads @ jacobian['dv_ds'].T / 100
+def _set_context_risk_source(jacobian: bytes = None, ctx: Dict = None):
+    # an exported calibration jacobian replaces the second Solver run entirely;
+    # otherwise the jacobian is read off the one Solver built here
+    ctx = swap_context if ctx is None else ctx
+    calibration_md = ctx['calibration_md']
+    terms = list(calibration_md['Term'])
+    if jacobian is not None:
+        ctx['jacobian'] = align_jacobian(decode_calibration_jacobian(jacobian), terms)
+        ctx['solver'] = None
+    else:
+        solver = form_solver(
+            ctx['curve_json'],
+            terms,
+            calibration_md
+        )
+        ctx['solver'] = solver
+        ctx['jacobian'] = solver_jacobian(solver, ctx['curve'], terms)
+def _pricing_kwargs() -> dict:
+    if swap_context['solver'] is None:
+        return {'curves': swap_context['curve']}
+    return {'solver': swap_context['solver']}
+_schedule_version = 0
+def _next_schedule_version() -> int:
+    # unique across contexts, so consumers can tell when flow dates/static columns must be resent
+    global _schedule_version
+    _schedule_version += 1
+    return _schedule_version
 def hydrate_swap():
     global swap_context 
-    swp = build_swap(swap_context['swap_row'])
-    swap_context['swap'] = swp
-    revalue_swap()
-    
+    token = _fixings_token(swap_context['fixings'])
+    if swap_context.get('swap') is None or swap_context.get('fixings_token') != token:
+        swap_context['swap'] = build_swap(swap_context['swap_row'])
+        swap_context['fixings_token'] = token
+        swap_context['schedule_version'] = _next_schedule_version()
+        swap_context.pop('hydrated', None)
+    swp = swap_context['swap']
+    if swap_context.get('hydrated') != swap_context['curve_version']:
+        revalue_swap()
+        context_store.measure(swap_context)
+        context_store.trim()
     return swp
 def get_current_swap_price()->pd.Series:
     global swap_context
@@ -138,35 +382,64 @@ def set_fixings(fixings_series: pd.Series):
     swap_context['fixings'] = fixings_series
     return fixings_series
 
-def update_curve_in_context(json_str: str,curve_md:pd.DataFrame):
+def update_curve_in_context(json_str: str,curve_md:pd.DataFrame,jacobian:bytes=None):
     global swap_context
-    swap_context['curve'] = from_json(json_str)
-    swap_context['curve_json'] = json_str
-    swap_context['calibration_md'] = curve_md
-    swap_context['solver'] = form_solver(
-        json_str,
-        list(curve_md['Term']),
-        curve_md
-    )
-    set_curve_deltas()
-    revalue_swap()
+    _use_curve_state(_curve_state(json_str, curve_md, jacobian))
+    if swap_context.get('hydrated') != swap_context['curve_version']:
+        revalue_swap()
 def revalue_swap():
     global swap_context
     swp:IRS = swap_context['swap']
-    solver:Solver = swap_context['solver']
-    npv = swp.npv(solver=solver).real
-    parrate = swp.rate(solver=solver).real
+    npv = swp.npv(**_pricing_kwargs()).real
+    parrate = swp.rate(**_pricing_kwargs()).real
     swap_context['swap_row']['NPV'] = npv
     swap_context['swap_row']['ParRate'] = parrate
-    save_swap_fixed_base_flows()
-    save_swap_float_base_flows()
-def get_swap_risk():
-    risk_tbl = swap_context.setdefault('swap',build_swap(swap_context['swap_row'])).delta(solver=swap_context['solver'])
+    save_swap_base_flows()
+    swap_context['hydrated'] = swap_context['curve_version']
+def _swap_delta(swp: IRS, solver: Solver, curve: Curve = None, jacobian: dict = None) -> pd.Series:
+    if jacobian is not None:
+        return pd.Series(data=jacobian_delta([swp.npv(curves=curve)], jacobian)[0], index=jacobian['terms'])
+    risk_tbl = swp.delta(solver=solver)
     terms = [i[-1] for i in risk_tbl.index]
     return pd.Series(data=risk_tbl.values.squeeze(),index=terms)
+
+def get_swap_risk():
+    if 'swap' not in swap_context:
+        swap_context['swap'] = build_swap(swap_context['swap_row'])
+    # memoized per curve version and built swap, so reopening a stored context costs nothing
+    stamp = (swap_context['curve_version'], id(swap_context['swap']))
+    if swap_context.get('risk_stamp') != stamp:
+        swap_context['risk'] = _swap_delta(swap_context['swap'], swap_context['solver'], swap_context['curve'], swap_context.get('jacobian'))
+        swap_context['risk_stamp'] = stamp
+    return swap_context['risk'].copy()
     # ones = np.ones(len(terms))
     # dummy_df = pd.Series(data=ones,index=terms)
     # return dummy_df
+def reprice_swaps(swap_rows: pd.DataFrame, solver: Solver, valuation_date: datetime, fixings: pd.Series = None, curve: Curve = None, jacobian: dict = None) -> pd.DataFrame:
+    """
+    Exact rateslib reprice of a batch of swaps against one shared Solver, or
+    against ``curve`` with deltas from a decoded calibration ``jacobian``.
+
+    Returns MainTbl/RiskTbl shaped rows: ID, NPV, ParRate, R (fixed leg
+    analytic delta) and c_<term> market deltas, ready to be merged back into
+    the approximation engine.
+    """
+    pricing = {'curves': curve} if jacobian is not None else {'solver': solver}
+    out = []
+    for _, row in swap_rows.iterrows():
+        row = row.copy()
+        row['StartDate'] = _to_naive(row['StartDate'])
+        row['TerminationDate'] = _to_naive(row['TerminationDate'])
+        swp = build_swap(row, valuation_date=valuation_date, fixings=fixings)
+        rec = {
+            'ID': row['ID'],
+            'NPV': swp.npv(**pricing).real,
+            'ParRate': swp.rate(**pricing).real,
+            'R': swp.analytic_delta(**pricing).real,
+        }
+        rec.update({f'c_{t}': v for t, v in _swap_delta(swp, solver, curve, jacobian).items()})
+        out.append(rec)
+    return pd.DataFrame(out)
 def form_risk_matrix(deltas:List[pd.DataFrame],referenced_base_length:int=0)->np.ndarray:
     arr = np.zeros((len(deltas),referenced_base_length))
     for i,d in enumerate(deltas):
@@ -175,76 +448,166 @@ def form_risk_matrix(deltas:List[pd.DataFrame],referenced_base_length:int=0)->np
 
 def reproject_sensitivities_to_md(duals:List[Dual])->pd.DataFrame:
     global swap_context
-    solver:Solver = swap_context['solver']
-    currency = 'USD' # TODO TIE TO rateslib defaults, get that from swap row (convert SOFR to usd_irs spec)
-    dualsdict = [{currency:d} for d in duals]
-    ds = [solver.delta(d) for d in dualsdict]
-    return form_risk_matrix(ds,referenced_base_length=len(ds[0].index))
-
-
-
-def save_swap_fixed_base_flows():
+    return jacobian_delta(duals, swap_context['jacobian'])
+
+
+
+def _leg_arrays(flows:pd.DataFrame, n_future:int, rates_move:bool)->Dict:
+    # base leg state as contiguous arrays plus preallocated refresh buffers; future rows are the tail
+    n = len(flows)
+    arrays = {
+        'start': n - n_future,
+        'df': flows['Discount Factor'].to_numpy(dtype='float64', copy=True),
+        'rate': flows['Rate'].to_numpy(dtype='float64', copy=True),
+        'notional': flows['Notional'].to_numpy(dtype='float64', copy=True),
+        'dcf': flows['Accrual Fraction'].to_numpy(dtype='float64', copy=True),
+        'cashflow': flows['Cashflow'].to_numpy(dtype='float64', copy=True),
+        'out': {'Discount Factor': np.empty(n), 'NPV': np.empty(n)},
+    }
+    if rates_move:
+        arrays['cashflow_per_rate'] = -arrays['notional'] * arrays['dcf'] / 100
+        arrays['out']['Rate'] = np.empty(n)
+        arrays['out']['Cashflow'] = np.empty(n)
+    return arrays
+
+def save_swap_base_flows():
+    # all base-flow duals (fixed DFs, float DFs, float rates) go through one reprojection
     global swap_context
     swp = swap_context['swap']
     calibrated_curve = swap_context['curve']
     valuation_date = swap_context['valuation_date']
-    dfs = [calibrated_curve[d.payment] for d in swp.leg1.periods if d.payment > valuation_date]
-    flows =get_fixed_cashflows()
+    fixed_dfs = [calibrated_curve[d.payment] for d in swp.leg1.periods if d.payment > valuation_date]
+    float_periods = [p for p in swp.leg2.periods if p.payment > valuation_date]
+    float_dfs = [calibrated_curve[p.payment] for p in float_periods]
+    rates = [p.rate(curve=calibrated_curve) for p in float_periods]
+    sens = reproject_sensitivities_to_md(fixed_dfs + float_dfs + rates)
+    n_fixed, n_float = len(fixed_dfs), len(float_periods)
     swap_context.setdefault('fixed_leg',{})
-    swap_context['fixed_leg']['cashflows'] = flows
-    swap_context['fixed_leg']['df_sensitivities'] = reproject_sensitivities_to_md(dfs)
-
-def save_swap_float_base_flows():
-    global swap_context
-    swp = swap_context['swap']
-    calibrated_curve = swap_context['curve']
-    valuation_date = swap_context['valuation_date']
-    dfs = [calibrated_curve[d.payment] for d in swp.leg2.periods if d.payment > valuation_date]
-    rates = [p.rate(curve=calibrated_curve) for p in swp.leg2.periods if p.payment > valuation_date]
-    flows =get_floating_cashflows()
+    swap_context['fixed_leg']['cashflows'] = get_fixed_cashflows()
+    swap_context['fixed_leg']['df_sensitivities'] = np.ascontiguousarray(sens[:n_fixed])
+    swap_context['fixed_leg']['arrays'] = _leg_arrays(swap_context['fixed_leg']['cashflows'], n_fixed, rates_move=False)
     swap_context.setdefault('float_leg',{})
-    swap_context['float_leg']['cashflows'] = flows
-    swap_context['float_leg']['df_sensitivities'] = reproject_sensitivities_to_md(dfs)
-    swap_context['float_leg']['rate_sensitivities'] = reproject_sensitivities_to_md(rates)
-
-def get_md_changes(new_md:pd.DataFrame=None)->pd.DataFrame:
-    base_md=swap_context.get('calibration_md',pd.DataFrame())
-    if base_md is None or base_md.empty:
+    swap_context['float_leg']['cashflows'] = get_floating_cashflows()
+    swap_context['float_leg']['df_sensitivities'] = np.ascontiguousarray(sens[n_fixed:n_fixed + n_float])
+    swap_context['float_leg']['rate_sensitivities'] = np.ascontiguousarray(sens[n_fixed + n_float:])
+    swap_context['float_leg']['arrays'] = _leg_arrays(swap_context['float_leg']['cashflows'], n_float, rates_move=True)
+
+def _md_index(calibration_md:pd.DataFrame)->Dict:
+    # calibration tenor order, resolved once per curve state; new quotes are mapped onto it
+    terms = tuple(calibration_md['Term'])
+    return {
+        'terms': terms,
+        'pos': {t: i for i, t in enumerate(terms)},
+        'base': calibration_md['Rate'].to_numpy(dtype='float64', copy=True),
+        'order': terms,
+        'perm': None,  # None while incoming quotes arrive in calibration order
+    }
+
+def get_md_changes(new_md:pd.DataFrame=None)->np.ndarray:
+    """Quote changes (percent) in calibration tenor order; missing or NaN quotes count as unchanged."""
+    idx = swap_context.get('md_index')
+    if idx is None or not len(idx['terms']):
         return pd.DataFrame()
-    base_md = base_md.set_index('Term')[['Rate']].squeeze()
     if new_md is None or new_md.empty:
-        new_md = base_md
+        return np.zeros(len(idx['terms']))
+    order = tuple(new_md['Term'])
+    if order != idx['order']:
+        idx['order'] = order
+        idx['perm'] = None if order == idx['terms'] else np.array([idx['pos'].get(t, -1) for t in order])
+    rates = new_md['Rate'].to_numpy(dtype='float64') * 100  # rateslib expects percents
+    if idx['perm'] is None:
+        changes = rates - idx['base']
     else:
-        new_md['Rate'] = new_md['Rate']
-        new_md = new_md.set_index('Term')[['Rate']].squeeze() * 100  # rateslib expects percents
-    return (new_md - base_md).fillna(0.0).to_numpy(dtype='float64')
+        changes = np.zeros(len(idx['terms']))
+        known = idx['perm'] >= 0
+        changes[idx['perm'][known]] = rates[known] - idx['base'][idx['perm'][known]]
+    changes[np.isnan(changes)] = 0.0
+    return changes
 
-def get_fixed_flows(new_md:pd.DataFrame=None)->pd.DataFrame:
+def refresh_leg_flows(leg:str, new_md:pd.DataFrame=None)->Dict[str, np.ndarray]:
+    """
+    Market-dependent cashflow columns of ``leg`` for ``new_md``, computed
+    into the leg's preallocated buffers (overwritten by the next refresh).
+    """
     global swap_context
-    md_changes = get_md_changes(new_md)
-    df = swap_context['fixed_leg']['cashflows'].copy()
-    dfs = df['Discount Factor'].to_numpy(dtype='float64')
-    sensitivities = swap_context['fixed_leg']['df_sensitivities'] 
-    updated_dfs = dfs + (sensitivities @ (md_changes * 100))
-    df['Discount Factor'] = updated_dfs
-    df['NPV'] = updated_dfs * df['Cashflow']
+    state = swap_context[f'{leg}_leg']
+    a = state['arrays']
+    out = a['out']
+    shift = get_md_changes(new_md) * 100
+    start = a['start']
+    dfs = out['Discount Factor']
+    np.copyto(dfs, a['df'])
+    dfs[start:] += state['df_sensitivities'] @ shift
+    if 'cashflow_per_rate' in a:
+        rate = out['Rate']
+        np.copyto(rate, a['rate'])
+        rate[start:] += state['rate_sensitivities'] @ shift
+        np.multiply(a['cashflow_per_rate'], rate, out=out['Cashflow'])
+        np.multiply(dfs, out['Cashflow'], out=out['NPV'])
+    else:
+        np.multiply(dfs, a['cashflow'], out=out['NPV'])
+    return out
+
+def _leg_flows_frame(leg:str, new_md:pd.DataFrame=None)->pd.DataFrame:
+    out = refresh_leg_flows(leg, new_md)
+    df = swap_context[f'{leg}_leg']['cashflows'].copy(deep=False)
+    for col, values in out.items():
+        df[col] = values.copy()
     return df
 
+def get_fixed_flows(new_md:pd.DataFrame=None)->pd.DataFrame:
+    return _leg_flows_frame('fixed', new_md)
+
 def get_float_flows(new_md:pd.DataFrame=None)->pd.DataFrame:
+    return _leg_flows_frame('float', new_md)
+
+# columns that move with the market; everything else only changes with the schedule
+_DYNAMIC_FLOW_COLUMNS = {'fixed': ('Discount Factor', 'NPV'), 'float': ('Discount Factor', 'Rate', 'Cashflow', 'NPV')}
+_emitted_schedules: Dict = {}  # leg -> schedule version whose static columns were last handed out
+
+def get_columnar_flows(leg:str, new_md:pd.DataFrame=None, force_static:bool=False)->Dict:
+    """
+    Cashflows of ``leg`` ('fixed' or 'float') as contiguous columns: the
+    market-dependent columns as float64 arrays on every call (the leg's
+    refresh buffers, valid until the next refresh), plus the schema, static
+    numeric columns (float64), dates (int32 days since 1970-01-01, NaT as
+    int32 min) and text columns (None where missing) only when the schedule
+    differs from the last one emitted for this leg. The worker copies each
+    array once out of the wasm heap.
+    """
     global swap_context
-    md_changes = get_md_changes(new_md)
-    df = swap_context['float_leg']['cashflows'].copy()
-    dfs = df['Discount Factor'].to_numpy(dtype='float64')
-    rates = df['Rate'].to_numpy(dtype='float64')
-    sensitivities = swap_context['float_leg']['df_sensitivities'] 
-    rate_sensitivities = swap_context['float_leg']['rate_sensitivities']
-    updated_dfs = dfs + (sensitivities @ (md_changes * 100))
-    updated_rates = rates + (rate_sensitivities @ (md_changes * 100))
-    df['Discount Factor'] = updated_dfs
-    df['Rate'] = updated_rates
-    df['Cashflow'] = -df['Notional']*df['Accrual Fraction']*(df['Rate']/100)
-    df['NPV'] = df['Discount Factor']*df['Cashflow']
-    return df
+    if leg not in _DYNAMIC_FLOW_COLUMNS:
+        raise ValueError(f"get_columnar_flows: unknown leg {leg!r}")
+    values = refresh_leg_flows(leg, new_md)
+    flows = swap_context[f'{leg}_leg']['cashflows']
+    dynamic = _DYNAMIC_FLOW_COLUMNS[leg]
+    out = {
+        'leg': leg,
+        'schedule': swap_context['schedule_version'],
+        'n': len(flows),
+        'values': {c: values[c] for c in dynamic},
+    }
+    if force_static or _emitted_schedules.get(leg) != out['schedule']:
+        schema, static = [], {}
+        for c in flows.columns:
+            col = flows[c]
+            if pd.api.types.is_datetime64_any_dtype(col):
+                kind = 'date'
+                days = col.to_numpy(dtype='datetime64[D]')
+                arr = np.where(np.isnat(days), np.iinfo('int32').min, days.astype('int64')).astype('int32')
+            elif pd.api.types.is_numeric_dtype(col):
+                kind = 'float'
+                arr = np.ascontiguousarray(col.to_numpy(dtype='float64'))
+            else:
+                kind = 'text'
+                arr = [None if pd.isna(v) else str(v) for v in col]
+            schema.append({'name': c, 'kind': kind, 'dynamic': c in dynamic})
+            if c not in dynamic:
+                static[c] = arr
+        out['schema'] = schema
+        out['static'] = static
+        _emitted_schedules[leg] = out['schedule']
+    return out
 
 
 def _form_fixings_df(period_idx:int)->pd.DataFrame:
@@ -262,57 +625,105 @@ def _form_fixings_df(period_idx:int)->pd.DataFrame:
         Risk = lambda x: table['risk'],
     )
     df = df.rename(columns={'ObservationDate':'Observation Date','AccrualFraction':'Accrual Fraction','HedgingNotional':'Hedging Notional'})
-    swap_context.setdefault('float_leg',{})\
-        .setdefault('periods',{})\
-        .setdefault(period_idx, {})['fixings_df'] = df
+    _period_cache(period_idx)['fixings_df'] = df
     return df
-def get_fixings_df(period_idx:int)->pd.DataFrame:
+def _period_cache(period_idx:int)->Dict:
+    # per float period memo, valid for one curve version and one built swap
     global swap_context
-    return swap_context.get('float_leg',{})\
-        .get('periods',{})\
-            .get(period_idx,{})\
-                .get('fixings_df',_form_fixings_df(period_idx))
-
-def set_curve_deltas():
-    global swap_context
-    curve = swap_context['curve']
-    solver = swap_context['solver']
-    deltas = [solver.delta({'USD':curve[d]})for d in curve.nodes.keys]
-    base_md_len = len(swap_context['calibration_md'])
-    dm = form_risk_matrix(deltas,referenced_base_length=base_md_len)
-    swap_context['curve_risk'] = dm
+    periods = swap_context.setdefault('float_leg',{}).setdefault('periods',{})
+    entry = periods.get(period_idx)
+    if entry is None or entry['curve_version'] != swap_context.get('curve_version') or entry['swap'] is not swap_context['swap']:
+        entry = periods[period_idx] = {'curve_version': swap_context.get('curve_version'), 'swap': swap_context['swap'], 'shocked': LRU(_SHOCKED_FIXINGS_LIMIT)}
+    return entry
+def get_fixings_df(period_idx:int)->pd.DataFrame:
+    entry = _period_cache(period_idx)
+    if 'fixings_df' not in entry:
+        _form_fixings_df(period_idx)
+    return entry['fixings_df']
+
+def set_curve_deltas(ctx: Dict = None):
+    ctx = swap_context if ctx is None else ctx
+    curve = ctx['curve']
+    dm = jacobian_delta([curve[d] for d in curve.nodes.keys], ctx['jacobian'])
+    ctx['curve_risk'] = dm
     return dm
+class ShockedCurveProvider:
+    """
+    Shocked versions of one base curve for drill-down. Base node DFs are
+    kept as an array, a shock is ``curve_risk @ (md_changes * 100)`` and the
+    result is written in place into a single reused float-node Curve. The
+    last market-change vector is remembered, so repeating it is free. The
+    returned curve is overwritten by the next distinct shock.
+    """
+    def __init__(self, base_curve: Curve, curve_risk: np.ndarray):
+        self.keys = list(base_curve.nodes.keys)
+        self.base = np.array([base_curve[d].real for d in self.keys], dtype='float64')
+        self.curve_risk = np.ascontiguousarray(curve_risk, dtype='float64')
+        self.curve = Curve(
+            id=base_curve.id,
+            convention=base_curve.meta.convention,
+            calendar=base_curve.meta.calendar,
+            modifier=base_curve.meta.modifier,
+            interpolation='log_linear',
+            nodes=dict(zip(self.keys, self.base.tolist()))
+        )
+        self._values = self.base.copy()
+        self._key = np.zeros(self.curve_risk.shape[1]).tobytes()
+        self.updates = 0
+        self.reuses = 0
+    def shocked(self, md_changes: np.ndarray) -> Curve:
+        md_changes = np.asarray(md_changes, dtype='float64')
+        key = md_changes.tobytes()
+        if key == self._key:
+            self.reuses += 1
+            return self.curve
+        np.matmul(self.curve_risk, md_changes * 100, out=self._values)
+        self._values += self.base
+        if hasattr(self.curve, '_set_node_vector'):
+            # the same in-place node write the Solver uses; the first node is fixed
+            self.curve._set_node_vector(self._values[1:].tolist(), 0)
+        else:
+            for d, v in zip(self.keys[1:], self._values[1:]):
+                self.curve.update_node(d, float(v))
+        self._key = key
+        self.updates += 1
+        return self.curve
+
 def get_shocked_curve(new_md:pd.DataFrame)->Curve:
     global swap_context
-    base_curve:Curve = swap_context['curve']
-    md_changes = get_md_changes(new_md)
-    deltas = swap_context['curve_risk']
-    updated_dfs = np.array([base_curve[d].real for d in base_curve.nodes.keys]) + (deltas @ (md_changes * 100))
-    shocked_nodes = {d: v for d, v in zip(base_curve.nodes.keys, updated_dfs)}
-    shocked_curve = Curve(
-        id=base_curve.id,
-        convention=base_curve.meta.convention,
-        calendar=base_curve.meta.calendar,
-        modifier=base_curve.meta.modifier,
-        interpolation='log_linear',
-        nodes=shocked_nodes
-    )
-    return shocked_curve
+    return swap_context['shocked_curves'].shocked(get_md_changes(new_md))
 
 
+_SHOCKED_FIXINGS_LIMIT = 8
 def get_updated_fixings_df(idx,new_md:pd.DataFrame)->Tuple[float,float,pd.DataFrame]:
     # return period rate, df, and fixings df with updated data
+    # memoized per market move, so repeated clicks on the same cashflow reuse the result
     global swap_context
+    entry = _period_cache(idx)
+    md_key = get_md_changes(new_md).tobytes()
+    cached = entry['shocked'].get(md_key)
+    if cached is not None:
+        period_rate,period_df,fixings_df = cached
+        return period_rate,period_df,fixings_df.copy()
     shocked_curve = get_shocked_curve(new_md)
-    base_fixings_df = get_fixings_df(idx)
-    new_fixings_df = swap_context['swap'].leg2.periods[idx].fixings_table(curve=shocked_curve)['sofr'] # TODO TIE sofr to swap row
-    only_forwsrds_df = new_fixings_df.loc[lambda x: x.index >= swap_context['valuation_date']]
-    base_fixings_df.loc[lambda x: x.index >= swap_context['valuation_date'], 'Fixing'] = new_fixings_df['rates']
-    base_fixings_df['Hedging Notional'] = only_forwsrds_df['notional']
-    base_fixings_df['Risk'] = only_forwsrds_df['risk']
-    period_rate = swap_context['swap'].leg2.periods[idx].rate(curve=shocked_curve).real
-    period_df = shocked_curve[swap_context['swap'].leg2.periods[idx].payment].real
-    return period_rate,period_df,base_fixings_df
+    period = swap_context['swap'].leg2.periods[idx]
+    fixings_df = get_fixings_df(idx).copy()
+    forward = fixings_df.index >= swap_context['valuation_date']
+    if forward.any():
+        # fixings_table rebuilds the whole period on the shocked curve; only its
+        # forward-dated rows are copied over, historic fixings keep their base values
+        new_fixings_df = period.fixings_table(curve=shocked_curve)['sofr'] # TODO TIE sofr to swap row
+        forward_df = new_fixings_df.loc[lambda x: x.index >= swap_context['valuation_date']]
+        fixings_df.loc[forward, 'Fixing'] = forward_df['rates']
+        fixings_df['Hedging Notional'] = forward_df['notional']
+        fixings_df['Risk'] = forward_df['risk']
+    else:
+        fixings_df['Hedging Notional'] = np.nan
+        fixings_df['Risk'] = np.nan
+    period_rate = period.rate(curve=shocked_curve).real
+    period_df = shocked_curve[period.payment].real
+    entry['shocked'].put(md_key, (period_rate,period_df,fixings_df))
+    return period_rate,period_df,fixings_df.copy()
 
 
 
@@ -14,6 +14,7 @@ import { ThemeBar } from "@/components/ThemeBar";
 import { CopyTableButton, tableToTsv } from "@/components/TableExportControls";
 import { RiskBarChart } from "@/components/RiskBarChart";
 import { buildRiskSeries } from "@/lib/riskSeries";
+import { decodeFlows, type FlowScheduleCache } from "@/lib/flowColumns";
 import { useIsMobileViewport } from "@/lib/useIsMobileViewport";
 import { ShareSwapButton } from "@/components/ShareSwapButton";
 
@@ -425,6 +426,10 @@ function DatafeedPageInner() {
   const pointDragRef = React.useRef(false);
   const latestCurveJsonRef = React.useRef<string | null>(null);
   const latestCurveMarketRef = React.useRef<Array<{ Term: string; Rate: number }>>([]);
+  // node-to-quote jacobian of latestCurveJsonRef, so the details worker can skip its own Solver
+  const latestJacobianRef = React.useRef<Uint8Array | null>(null);
+  // schema/static cashflow columns per leg, resent by the details worker only on a new schedule
+  const flowSchedulesRef = React.useRef<FlowScheduleCache>({});
   const swapSnapshotRef = React.useRef<BlotterRow | null>(null);
   const linkPauseRef = React.useRef(false);
   const activeSwapId = swapId;
@@ -658,6 +663,7 @@ function DatafeedPageInner() {
       setModalRisk(null);
       setModalFixedFlows([]);
       setModalFloatFlows([]);
+      flowSchedulesRef.current = {};
       setModalFloatFixings(null);
       setModalSwapRow(null);
       setTermsheetLoading(false);
@@ -722,13 +728,16 @@ function DatafeedPageInner() {
         const cal = await calRes.json();
         const md = await mdRes.json();
         if (cancelled) return;
-        const marketRows = Array.isArray(md.rows) ? md.rows : [];
+        // prefer the live calibration: it comes with the jacobian, so opening the modal needs no Solver
+        const liveCurveJson = latestCurveJsonRef.current;
+        const marketRows = liveCurveJson ? latestCurveMarketRef.current : Array.isArray(md.rows) ? md.rows : [];
         console.log("[swap details] sending context md rows", marketRows.length, marketRows[0]);
         detailsRef.current?.postMessage({
           type: "context",
           swapId,
           swap: normalizedSwap,
-          curveJson: cal?.json,
+          curveJson: liveCurveJson ?? cal?.json,
+          jacobian: liveCurveJson ? latestJacobianRef.current : null,
           market: marketRows,
         });
       } catch (err) {
@@ -777,16 +786,19 @@ function DatafeedPageInner() {
         setModalRisk(msg.risk || null);
         if (msg.swap) applyModalSwapUpdate(msg.swap as Record<string, unknown>);
         if (msg.price) applyModalSwapUpdate(msg.price as Record<string, unknown>);
-      } else if (msg.type === "fixed_flows") {
+      } else if (msg.type === "fixed_flows" || msg.type === "float_flows") {
         if (msg.swapId && msg.swapId !== swapIdRef.current) return;
-        const rows = Array.isArray(msg.rows) ? msg.rows : [];
-        setModalFixedFlows(rows);
-        console.log("[swap details] fixed flows update", rows);
-      } else if (msg.type === "float_flows") {
-        if (msg.swapId && msg.swapId !== swapIdRef.current) return;
-        const rows = Array.isArray(msg.rows) ? msg.rows : [];
-        setModalFloatFlows(rows);
-        console.log("[swap details] float flows update", rows);
+        const leg = msg.type === "fixed_flows" ? "fixed" : "float";
+        const setFlows = leg === "fixed" ? setModalFixedFlows : setModalFloatFlows;
+        const rows = decodeFlows(flowSchedulesRef.current, leg, msg.flows);
+        if (rows) {
+          setFlows(rows);
+          console.log(`[swap details] ${leg} flows update`, rows.length);
+        } else if (msg.flows) {
+          console.error(`[swap details] ${leg} flows for unknown schedule`, msg.flows.schedule);
+        } else {
+          setFlows([]);
+        }
       } else if (msg.type === "float_fixings") {
         if (msg.swapId && msg.swapId !== swapIdRef.current) return;
         setModalFloatFixings({
@@ -1259,12 +1271,15 @@ const renderRateEditCell = React.useCallback((params: GridRenderEditCellParams)
       } else if (msg.type === "curve_update") {
         const curveJson = typeof msg.curveJson === "string" ? msg.curveJson : null;
         const marketRows = Array.isArray(msg.market) ? msg.market : [];
+        const jacobian = msg.jacobian instanceof Uint8Array ? msg.jacobian : null;
         latestCurveJsonRef.current = curveJson;
         latestCurveMarketRef.current = marketRows;
+        latestJacobianRef.current = jacobian;
         if (curveJson && swapSnapshotRef.current && detailsRef.current) {
           detailsRef.current.postMessage({
             type: "updateCurve",
             curveJson,
+            jacobian,
             market: marketRows,
             swapId: swapIdRef.current,
           });
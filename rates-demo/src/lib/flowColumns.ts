@@ -0,0 +1,51 @@
+// Columnar cashflow payloads posted by the swap details worker.
+// Market-dependent columns arrive on every refresh; the schema, static
+// numeric columns, dates (int32 epoch days) and text only when the leg's
+// schedule changes, so the page keeps them per leg and decodes rows locally.
+
+export type FlowLeg = "fixed" | "float";
+export type FlowColumn = { name: string; kind: "float" | "date" | "text"; dynamic: boolean };
+export type FlowColumnData = Float64Array | Int32Array | Array<string | null>;
+export type FlowColumns = Record<string, FlowColumnData>;
+export type FlowPayload = {
+  schedule: number;
+  n: number;
+  values: FlowColumns;
+  schema?: FlowColumn[];
+  static?: FlowColumns;
+};
+export type FlowSchedule = { schedule: number; schema: FlowColumn[]; columns: FlowColumns };
+export type FlowScheduleCache = Partial<Record<FlowLeg, FlowSchedule>>;
+
+// int32 minimum, how get_columnar_flows encodes NaT
+export const NAT_DAY = -2147483648;
+
+export function epochDayToIso(day: number): string | null {
+  return day === NAT_DAY ? null : new Date(day * 86400000).toISOString().slice(0, 10);
+}
+
+/**
+ * Rebuild row records for `leg` from a worker payload, updating the cached
+ * schedule when the payload carries one. Returns null when the payload refers
+ * to a schedule the page has not received.
+ */
+export function decodeFlows(cache: FlowScheduleCache, leg: FlowLeg, payload: FlowPayload | null | undefined): Record<string, unknown>[] | null {
+  if (!payload) return null;
+  if (payload.schema && payload.static) {
+    cache[leg] = { schedule: payload.schedule, schema: payload.schema, columns: payload.static };
+  }
+  const sched = cache[leg];
+  if (!sched || sched.schedule !== payload.schedule) return null;
+  const out: Record<string, unknown>[] = new Array(payload.n);
+  for (let i = 0; i < payload.n; i++) {
+    const rec: Record<string, unknown> = {};
+    for (const col of sched.schema) {
+      const v = (col.dynamic ? payload.values : sched.columns)[col.name]?.[i];
+      if (col.kind === "date") rec[col.name] = v == null ? null : epochDayToIso(v as number);
+      else if (col.kind === "float") rec[col.name] = Number.isFinite(v) ? v : null;
+      else rec[col.name] = v ?? null;
+    }
+    out[i] = rec;
+  }
+  return out;
+}
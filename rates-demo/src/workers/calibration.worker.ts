@@ -21,13 +21,14 @@ async function init(baseUrl: string, datafeedUrl: string, calibUrl: string) {
       "import micropip; await micropip.install('rateslib')"
     );
     // Load python modules from public
-    const [dfRes, ccRes, swapRes] = await Promise.all([
+    const [dfRes, ccRes, swapRes, lruRes] = await Promise.all([
       fetch(datafeedUrl, { cache: "no-store" }),
       fetch(calibUrl, { cache: "no-store" }),
       fetch("/py/swap_approximation.py", { cache: "no-store" }),
+      fetch("/py/lru.py", { cache: "no-store" }),
     ]);
-    if (!dfRes.ok || !ccRes.ok || !swapRes.ok) throw new Error("Failed to fetch python modules");
-    const [dfCode, ccCode, swapCode] = await Promise.all([dfRes.text(), ccRes.text(), swapRes.text()]);
+    if (!dfRes.ok || !ccRes.ok || !swapRes.ok || !lruRes.ok) throw new Error("Failed to fetch python modules");
+    const [dfCode, ccCode, swapCode, lruCode] = await Promise.all([dfRes.text(), ccRes.text(), swapRes.text(), lruRes.text()]);
 
     const valStr = process.env.NEXT_PUBLIC_VALUATION_DATE;
     const valLine = valStr
@@ -41,6 +42,9 @@ async function init(baseUrl: string, datafeedUrl: string, calibUrl: string) {
       + `m_data = types.ModuleType('py.datafeed');\n`
       + `exec(compile(r'''${escapeForPyExec(dfCode)}''', 'py/datafeed.py', 'exec'), m_data.__dict__)\n`
       + `sys.modules['py.datafeed'] = m_data\n`
+      + `m_lru = types.ModuleType('py.lru'); m_lru.__package__='py'\n`
+      + `exec(compile(r'''${escapeForPyExec(lruCode)}''', 'py/lru.py', 'exec'), m_lru.__dict__)\n`
+      + `sys.modules['py.lru'] = m_lru\n`
       + `m_curv = types.ModuleType('py.curve_calibration'); m_curv.__package__='py'\n`
       + valLine
       + `exec(compile(r'''${escapeForPyExec(ccCode)}''', 'py/curve_calibration.py', 'exec'), m_curv.__dict__)\n`
@@ -48,8 +52,11 @@ async function init(baseUrl: string, datafeedUrl: string, calibUrl: string) {
       + `m_swap = types.ModuleType('py.swap_approximation'); m_swap.__package__='py'\n`
       + `exec(compile(r'''${escapeForPyExec(swapCode)}''', 'py/swap_approximation.py', 'exec'), m_swap.__dict__)\n`
       + `sys.modules['py.swap_approximation'] = m_swap\n`
-      + `from py.curve_calibration import calibrate_curve, get_discount_factor_curve, get_zero_rate_curve, get_forward_rate_curve, set_curve_from_json\n`;
+      + `from py.curve_calibration import calibrate_curve, get_discount_factor_curve, get_zero_rate_curve, get_forward_rate_curve, set_curve_from_json, get_calibration_jacobian, CalibrationScheduler\n`
+      + CALIBRATION_DRIVER;
 
+    pyodide.globals.set("post_calibration", postCalibration);
+    pyodide.globals.set("post_calibration_error", postCalibrationError);
     pyodide.runPython(bootstrap);
     if (calStr) {
       // Avoid double-escaping by passing the JSON through globals
@@ -65,6 +72,56 @@ async function init(baseUrl: string, datafeedUrl: string, calibUrl: string) {
   }
 }
 
+// One module-level scheduler: every recalibrate message is a cheap submit,
+// snapshots arriving during a solve coalesce, and only one solve runs at a time.
+const CALIBRATION_DRIVER = `
+import json
+import pandas as pd
+from pyodide.ffi import to_js
+def _curve_records(frame):
+    return frame.reset_index().to_dict(orient='records')
+def _publish_calibration(curve_json, data, latency):
+    try:
+        curves = json.dumps({
+            'discount': _curve_records(get_discount_factor_curve()),
+            'zero': _curve_records(get_zero_rate_curve()),
+            'forward': _curve_records(get_forward_rate_curve()),
+        })
+    except Exception as e:
+        post_calibration_error(str(e))
+        return
+    # node-to-quote jacobian lets the details worker skip its own Solver run;
+    # it is optional, so a failed export still publishes the curve
+    try:
+        jacobian = to_js(get_calibration_jacobian())
+    except Exception as e:
+        print('[calibration worker] jacobian export error', e)
+        jacobian = None
+    post_calibration(curve_json, curves, json.dumps(data.to_dict(orient='records')), jacobian)
+calibration_scheduler = CalibrationScheduler(
+    calibrate=calibrate_curve,
+    publish=_publish_calibration,
+    on_error=lambda error, data: post_calibration_error(str(error)),
+)
+def submit_calibration(market_json):
+    calibration_scheduler.submit(pd.DataFrame(json.loads(market_json)))
+`;
+
+function postCalibration(curveJson: string, curvesJson: string, marketJson: string, jacobian?: Uint8Array | null) {
+  const curves = JSON.parse(curvesJson);
+  const market = JSON.parse(marketJson);
+  ctx.postMessage({ type: "curves", discount: curves.discount, zero: curves.zero, forward: curves.forward });
+  if (jacobian instanceof Uint8Array) {
+    ctx.postMessage({ type: "curve_update", curveJson, market, jacobian }, [jacobian.buffer]);
+  } else {
+    ctx.postMessage({ type: "curve_update", curveJson, market });
+  }
+}
+
+function postCalibrationError(error: string) {
+  ctx.postMessage({ type: "error", error });
+}
+
 function escapeForPyExec(code: string): string { return code.replace(/\\/g, "\\\\").replace(/\u2028|\u2029/g, " ").replace(/`/g, "\`").replace(/\r?\n/g, "\n").replace(/"""/g, "\"\"\""); }
 
 ctx.onmessage = async (ev: MessageEvent) => {
@@ -78,23 +135,9 @@ ctx.onmessage = async (ev: MessageEvent) => {
     if (!initialized) return;
     const market: Array<{ Term: string; Rate: number }> = msg.market;
     try {
-      const jsonStr = JSON.stringify(market);
-      // Build DataFrame in Python
-      pyodide.runPython(`import pandas as pd\nimport json\ndata = pd.DataFrame(json.loads(r'''${jsonStr}'''))`);
-      // Calibrate
-      const curveJson = pyodide.runPython("calibrate_curve(data)");
-      // Extract curves as JSON strings
-      const discount = pyodide.runPython(
-        "import json\njson.dumps(get_discount_factor_curve().reset_index().to_dict(orient='records'))"
-      );
-      const zero = pyodide.runPython(
-        "import json\njson.dumps(get_zero_rate_curve().reset_index().to_dict(orient='records'))"
-      );
-      const forward = pyodide.runPython(
-        "import json\njson.dumps(get_forward_rate_curve().reset_index().to_dict(orient='records'))"
-      );
-      ctx.postMessage({ type: "curves", discount: JSON.parse(discount), zero: JSON.parse(zero), forward: JSON.parse(forward) });
-      ctx.postMessage({ type: "curve_update", curveJson, market });
+      // results come back through postCalibration once the scheduler has solved
+      pyodide.globals.set("calibration_market_json", JSON.stringify(market));
+      await pyodide.runPythonAsync("submit_calibration(calibration_market_json)");
     } catch (e) {
       ctx.postMessage({ type: "error", error: String(e) });
     }
@@ -1,6 +1,8 @@
 // Swap details worker: keeps a persistent Pyodide instance to price/risk a single swap.
 export {};
 
+import type { FlowColumns, FlowLeg, FlowPayload } from "@/lib/flowColumns";
+
 type MarketRow = { Term: string; Rate: number };
 
 const ctx: any = self as any;
@@ -22,67 +24,84 @@ function serializeSwapRow(): Record<string, unknown> | null {
   return Object.keys(out).length ? out : null;
 }
 
-function computeFixedFlows(rows?: MarketRow[]): any[] {
-  if (!pyodide) return [];
-  const payload = Array.isArray(rows) ? rows.map((r) => ({ Term: String(r.Term), Rate: Number(r.Rate) })) : null;
-  const pyCode = payload && payload.length
-    ? `import pandas as pd, json\nmd = pd.DataFrame(json.loads(r'''${escapeForPyExec(JSON.stringify(payload))}'''))\n` +
-      `md['Rate'] = md['Rate'].astype(float)\n` +
-      `out = get_fixed_flows(md)\n` +
-      `out = out.reset_index(drop=True) if hasattr(out, 'reset_index') else out\n` +
-      `if hasattr(out, 'columns'):\n` +
-      `    for col in out.columns:\n` +
-      `        ser = out[col]\n` +
-      `        if hasattr(ser, 'dt'):\n` +
-      `            out[col] = ser.astype(str)\n` +
-      `json.dumps(out.to_dict(orient='records'))`
-    : `import pandas as pd, json\nout = get_fixed_flows()\n` +
-      `out = out.reset_index(drop=True) if hasattr(out, 'reset_index') else out\n` +
-      `if hasattr(out, 'columns'):\n` +
-      `    for col in out.columns:\n` +
-      `        ser = out[col]\n` +
-      `        if hasattr(ser, 'dt'):\n` +
-      `            out[col] = ser.astype(str)\n` +
-      `json.dumps(out.to_dict(orient='records'))`;
-  try {
-    if (payload) console.log("[swap details worker] fixed flow payload", payload);
-    const result = runPy(pyCode);
-    return result ? JSON.parse(result as string) : [];
-  } catch (err) {
-    console.error("[swap details worker] computeFixedFlows error", err);
-    return [];
+// schedule last posted per leg; the page keeps that schedule's schema/static columns
+const sentSchedules: Partial<Record<FlowLeg, number>> = {};
+
+function readColumns(dictProxy: any, transfer: Transferable[]): FlowColumns {
+  const out: FlowColumns = {};
+  for (const key of dictProxy) {
+    const value = dictProxy.get(key);
+    if (value?.type === "numpy.ndarray") {
+      const buf = value.getBuffer();
+      try {
+        const arr = buf.data.slice(); // one copy out of the wasm heap, then transferred
+        transfer.push(arr.buffer);
+        out[key] = arr;
+      } finally {
+        buf.release();
+      }
+    } else {
+      const list = value?.toJs ? value.toJs() : value;
+      out[key] = Array.isArray(list) ? list.map((v: string | null | undefined) => v ?? null) : [];
+    }
+    value?.destroy?.();
   }
+  return out;
 }
 
-function computeFloatFlows(rows?: MarketRow[]): any[] {
-  if (!pyodide) return [];
+function computeFlows(leg: FlowLeg, rows?: MarketRow[]): { flows: FlowPayload; transfer: Transferable[] } | null {
+  if (!pyodide) return null;
   const payload = Array.isArray(rows) ? rows.map((r) => ({ Term: String(r.Term), Rate: Number(r.Rate) })) : null;
-  const pyCode = payload && payload.length
-    ? `import pandas as pd, json\nmd = pd.DataFrame(json.loads(r'''${escapeForPyExec(JSON.stringify(payload))}'''))\n` +
-      `md['Rate'] = md['Rate'].astype(float)\n` +
-      `out = get_float_flows(md)\n` +
-      `out = out.reset_index(drop=True) if hasattr(out, 'reset_index') else out\n` +
-      `if hasattr(out, 'columns'):\n` +
-      `    for col in out.columns:\n` +
-      `        ser = out[col]\n` +
-      `        if hasattr(ser, 'dt'):\n` +
-      `            out[col] = ser.astype(str)\n` +
-      `json.dumps(out.to_dict(orient='records'))`
-    : `import pandas as pd, json\nout = get_float_flows()\n` +
-      `out = out.reset_index(drop=True) if hasattr(out, 'reset_index') else out\n` +
-      `if hasattr(out, 'columns'):\n` +
-      `    for col in out.columns:\n` +
-      `        ser = out[col]\n` +
-      `        if hasattr(ser, 'dt'):\n` +
-      `            out[col] = ser.astype(str)\n` +
-      `json.dumps(out.to_dict(orient='records'))`;
+  pyodide.globals.set("swap_flows_md_json", payload && payload.length ? JSON.stringify(payload) : "");
+  const run = (force: boolean) => runPy(
+    `import pandas as pd, json
+` +
+    `_flows_md = pd.DataFrame(json.loads(swap_flows_md_json)) if swap_flows_md_json else None
+` +
+    `if _flows_md is not None:
+` +
+    `    _flows_md['Rate'] = _flows_md['Rate'].astype(float)
+` +
+    `get_columnar_flows('${leg}', _flows_md, ${force ? "True" : "False"})`
+  );
+  let res: any = null;
   try {
-    if (payload) console.log("[swap details worker] float flow payload", payload);
-    const result = runPy(pyCode);
-    return result ? JSON.parse(result as string) : [];
+    res = run(sentSchedules[leg] === undefined);
+    if (!res.has("schema") && sentSchedules[leg] !== res.get("schedule")) {
+      // Python already emitted this schedule but the page never got it
+      res.destroy();
+      res = run(true);
+    }
+    const transfer: Transferable[] = [];
+    const valuesProxy = res.get("values");
+    const flows: FlowPayload = {
+      schedule: res.get("schedule"),
+      n: res.get("n"),
+      values: readColumns(valuesProxy, transfer),
+    };
+    valuesProxy.destroy();
+    if (res.has("schema")) {
+      const schemaProxy = res.get("schema");
+      const staticProxy = res.get("static");
+      flows.schema = schemaProxy.toJs({ dict_converter: Object.fromEntries });
+      flows.static = readColumns(staticProxy, transfer);
+      schemaProxy.destroy();
+      staticProxy.destroy();
+    }
+    sentSchedules[leg] = flows.schedule;
+    return { flows, transfer };
   } catch (err) {
-    console.error("[swap details worker] computeFloatFlows error", err);
-    return [];
+    console.error(`[swap details worker] compute ${leg} flows error`, err);
+    return null;
+  } finally {
+    res?.destroy?.();
+  }
+}
+
+function postFlows(swapId: string | null, rows?: MarketRow[]) {
+  for (const leg of ["fixed", "float"] as const) {
+    const out = computeFlows(leg, rows);
+    ctx.postMessage({ type: `${leg}_flows`, swapId, flows: out?.flows ?? null }, out?.transfer ?? []);
   }
 }
 
@@ -170,13 +189,20 @@ async function init(baseUrl: string, detailsUrl: string) {
     await pyodide.loadPackage(["numpy", "pandas", "micropip"]);
     await pyodide.runPythonAsync("import micropip; await micropip.install('rateslib')");
 
-    const swapDetailsCodeRes = await fetch(detailsUrl, { cache: "no-store" });
+    const [swapDetailsCodeRes, lruCodeRes] = await Promise.all([
+      fetch(detailsUrl, { cache: "no-store" }),
+      fetch("/py/lru.py", { cache: "no-store" }),
+    ]);
     if (!swapDetailsCodeRes.ok) throw new Error("failed to fetch swap_details.py");
-    const swapDetailsCode = await swapDetailsCodeRes.text();
+    if (!lruCodeRes.ok) throw new Error("failed to fetch lru.py");
+    const [swapDetailsCode, lruCode] = await Promise.all([swapDetailsCodeRes.text(), lruCodeRes.text()]);
 
 const bootstrap = `
 import types, sys
 pkg = types.ModuleType('py'); pkg.__path__ = []; sys.modules['py'] = pkg
+m_lru = types.ModuleType('py.lru'); m_lru.__package__='py'
+exec(compile(${JSON.stringify(lruCode)}, 'py/lru.py', 'exec'), m_lru.__dict__)
+sys.modules['py.lru'] = m_lru
 m_details = types.ModuleType('py.swap_details'); m_details.__package__='py'
 exec(compile(${JSON.stringify(swapDetailsCode)}, 'py/swap_details.py', 'exec'), m_details.__dict__)
 sys.modules['py.swap_details'] = m_details
@@ -192,6 +218,7 @@ from py.swap_details import (
     get_fixed_flows,
     get_float_flows,
     get_clicked_cashflow_fixings_data,
+    get_columnar_flows,
     build_swap_termsheet_html,
 )
 `;
@@ -214,11 +241,15 @@ ctx.onmessage = async (ev: MessageEvent) => {
   }
   if (msg.type === "context") {
     if (!initialized) return;
+    // a (re)opened modal starts without cached schedules
+    delete sentSchedules.fixed;
+    delete sentSchedules.float;
     try {
       const swapJson = JSON.stringify(msg.swap || {});
       const mdJson = JSON.stringify(msg.market || []);
       const curveJson: string = msg.curveJson || "";
       pyodide.globals.set("swap_curve_json", curveJson);
+      pyodide.globals.set("swap_context_jacobian", msg.jacobian instanceof Uint8Array ? msg.jacobian : null);
       const infoJson = pyodide.runPython(
         `
 import json, pandas as pd
@@ -230,9 +261,10 @@ if 'StartDate' in swap_row and swap_row['StartDate'] is not None:
 if 'TerminationDate' in swap_row and swap_row['TerminationDate'] is not None:
     swap_row['TerminationDate'] = pd.to_datetime(swap_row['TerminationDate'])
 cal_md = pd.DataFrame(md_obj)
-set_swap_context(swap_row, swap_curve_json, cal_md)
+jac = bytes(swap_context_jacobian.to_py()) if swap_context_jacobian is not None else None
+set_swap_context(swap_row, swap_curve_json, cal_md, jac)
 info = {'index': get_swap_fixing_index_name(), 'bounds': [dt.isoformat() for dt in get_inclusive_fixings_date_bounds()]}
-del swap_curve_json
+del swap_curve_json, swap_context_jacobian
 json.dumps(info)
 `
       ) as string;
@@ -275,8 +307,7 @@ del swap_fixings_payload_json
 `
       );
       emitRiskAndPrice(msg.swapId);
-      ctx.postMessage({ type: "fixed_flows", swapId: msg.swapId, rows: computeFixedFlows() });
-      ctx.postMessage({ type: "float_flows", swapId: msg.swapId, rows: computeFloatFlows() });
+      postFlows(msg.swapId);
     } catch (e) {
       ctx.postMessage({ type: "error", swapId: msg.swapId, error: String(e) });
     }
@@ -286,19 +317,20 @@ del swap_fixings_payload_json
       const curveJson: string = msg.curveJson || "";
       const mdJson = JSON.stringify(msg.market || []);
       pyodide.globals.set("swap_curve_update_json", curveJson);
+      pyodide.globals.set("swap_curve_jacobian", msg.jacobian instanceof Uint8Array ? msg.jacobian : null);
       pyodide.runPython(
         `
 import pandas as pd, json
 md_obj = json.loads(r'''${escapeForPyExec(mdJson)}''')
 cal_md = pd.DataFrame(md_obj)
-update_curve_in_context(swap_curve_update_json, cal_md)
+jac = bytes(swap_curve_jacobian.to_py()) if swap_curve_jacobian is not None else None
+update_curve_in_context(swap_curve_update_json, cal_md, jac)
 hydrate_swap()
-del swap_curve_update_json
+del swap_curve_update_json, swap_curve_jacobian
 `
       );
       emitRiskAndPrice(msg.swapId);
-      ctx.postMessage({ type: "fixed_flows", swapId: msg.swapId, rows: computeFixedFlows() });
-      ctx.postMessage({ type: "float_flows", swapId: msg.swapId, rows: computeFloatFlows() });
+      postFlows(msg.swapId);
     } catch (e) {
       ctx.postMessage({ type: "error", swapId: msg.swapId, error: String(e) });
     }
@@ -306,8 +338,7 @@ del swap_curve_update_json
     if (!initialized) return;
     try {
       const rows = Array.isArray(msg.market) ? (msg.market as Array<{ Term: string; Rate: number }>) : [];
-      ctx.postMessage({ type: "fixed_flows", swapId: msg.swapId, rows: computeFixedFlows(rows) });
-      ctx.postMessage({ type: "float_flows", swapId: msg.swapId, rows: computeFloatFlows(rows) });
+      postFlows(msg.swapId, rows);
     } catch (e) {
       ctx.postMessage({ type: "error", swapId: msg.swapId, error: String(e) });
     }
@@ -2,6 +2,12 @@ import { afterEach, describe, expect, it, vi } from "vitest";
 
 const curveJson = '{"curve": "data"}';
 const market = [{ Term: "1Y", Rate: 0.02 }];
+const jacobianBytes = new Uint8Array([83, 66, 74, 49]);
+const curves = {
+  discount: [{ Term: "1Y", discount: 0.99 }],
+  zero: [{ Term: "1Y", zero: 0.01 }],
+  forward: [{ Term: "1Y", forward: 0.011 }],
+};
 
 describe("calibration.worker", () => {
   let messages: any[] = [];
@@ -11,20 +17,28 @@ describe("calibration.worker", () => {
   let runPython: ReturnType<typeof vi.fn>;
   let runPythonAsync: ReturnType<typeof vi.fn>;
   let globalsSet: ReturnType<typeof vi.fn>;
+  let pyGlobals: Record<string, any>;
+  let submitted: string[];
+  // what the Python scheduler's publish step hands back: null when the jacobian export failed
+  let jacobianExport: Uint8Array | null;
 
   const setupWorker = async () => {
     vi.resetModules();
     messages = [];
+    submitted = [];
+    pyGlobals = {};
+    jacobianExport = jacobianBytes;
     importScripts = vi.fn();
-    globalsSet = vi.fn();
-    runPython = vi.fn((code: string) => {
-      if (code.includes("calibrate_curve(data)")) return "CURVE_STATE";
-      if (code.includes("get_discount_factor_curve")) return JSON.stringify([{ Term: "1Y", discount: 0.99 }]);
-      if (code.includes("get_zero_rate_curve")) return JSON.stringify([{ Term: "1Y", zero: 0.01 }]);
-      if (code.includes("get_forward_rate_curve")) return JSON.stringify([{ Term: "1Y", forward: 0.011 }]);
-      return "";
+    globalsSet = vi.fn((name: string, value: any) => {
+      pyGlobals[name] = value;
+    });
+    runPython = vi.fn(() => "");
+    runPythonAsync = vi.fn(async (code: string) => {
+      if (!code.includes("submit_calibration(calibration_market_json)")) return;
+      const marketJson = pyGlobals.calibration_market_json;
+      submitted.push(marketJson);
+      pyGlobals.post_calibration("CURVE_STATE", JSON.stringify(curves), marketJson, jacobianExport?.slice() ?? undefined);
     });
-    runPythonAsync = vi.fn(async () => {});
     const pyodide = {
       loadPackage: vi.fn(async () => {}),
       runPython,
@@ -37,7 +51,8 @@ describe("calibration.worker", () => {
       .mockResolvedValueOnce(new Response(JSON.stringify({ json: curveJson }), { status: 200 }))
       .mockResolvedValueOnce(new Response("# datafeed", { status: 200 }))
       .mockResolvedValueOnce(new Response("# calibration", { status: 200 }))
-      .mockResolvedValueOnce(new Response("# swap approx", { status: 200 }));
+      .mockResolvedValueOnce(new Response("# swap approx", { status: 200 }))
+      .mockResolvedValueOnce(new Response("# lru", { status: 200 }));
     vi.stubGlobal("fetch", fetchMock);
     vi.stubGlobal("self", {
       importScripts,
@@ -62,24 +77,44 @@ describe("calibration.worker", () => {
     expect(runPythonAsync).toHaveBeenCalledWith(expect.stringContaining("micropip.install"));
     expect(globalsSet).toHaveBeenCalledWith("calibration_json_str", curveJson);
     expect(runPython).toHaveBeenCalledWith(expect.stringContaining("set_curve_from_json"));
+    expect(runPython).toHaveBeenCalledWith(expect.stringContaining("calibration_scheduler = CalibrationScheduler("));
     expect(messages).toContainEqual({ type: "ready" });
   });
 
-  it("recalibrates and emits curve snapshots", async () => {
+  it("submits recalibrations to the scheduler and emits curve snapshots", async () => {
     await setupWorker();
     await onmessage?.({ data: { type: "init" } } as any);
     messages = [];
 
     await onmessage?.({ data: { type: "recalibrate", market } } as any);
 
-    expect(runPython).toHaveBeenCalledWith(expect.stringContaining("calibrate_curve(data)"));
-    const curvesMsg = messages.find((m) => m.type === "curves");
-    expect(curvesMsg).toEqual({
-      type: "curves",
-      discount: [{ Term: "1Y", discount: 0.99 }],
-      zero: [{ Term: "1Y", zero: 0.01 }],
-      forward: [{ Term: "1Y", forward: 0.011 }],
-    });
-    expect(messages).toContainEqual({ type: "curve_update", curveJson: "CURVE_STATE", market });
+    expect(submitted).toEqual([JSON.stringify(market)]);
+    expect(runPython).not.toHaveBeenCalledWith(expect.stringContaining("calibrate_curve(data)"));
+    expect(messages.find((m) => m.type === "curves")).toEqual({ type: "curves", ...curves });
+    expect(messages).toContainEqual({ type: "curve_update", curveJson: "CURVE_STATE", market, jacobian: jacobianBytes });
+  });
+
+  it("still emits curve_update without a jacobian when the export fails", async () => {
+    await setupWorker();
+    await onmessage?.({ data: { type: "init" } } as any);
+    messages = [];
+    jacobianExport = null;
+
+    await onmessage?.({ data: { type: "recalibrate", market } } as any);
+
+    const update = messages.find((m) => m.type === "curve_update");
+    expect(update).toEqual({ type: "curve_update", curveJson: "CURVE_STATE", market });
+    expect(update).not.toHaveProperty("jacobian");
+    expect(messages.some((m) => m.type === "error")).toBe(false);
+  });
+
+  it("reports failed solves as errors", async () => {
+    await setupWorker();
+    await onmessage?.({ data: { type: "init" } } as any);
+    messages = [];
+
+    pyGlobals.post_calibration_error("no convergence");
+
+    expect(messages).toEqual([{ type: "error", error: "no convergence" }]);
   });
 });
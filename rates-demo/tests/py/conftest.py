@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+# the Pyodide workers load public/py as plain modules; mirror that here
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "public", "py"))
+
+TERMS = ["1M", "3M", "6M", "1Y", "2Y", "3Y", "5Y", "7Y", "10Y", "20Y", "30Y"]
+RATES = [5.30, 5.32, 5.25, 5.00, 4.60, 4.30, 4.10, 4.05, 4.00, 4.10, 4.00]
+
+
+@pytest.fixture
+def make_curve():
+    """Factory for an uncalibrated SOFR curve with a node at every calibration term."""
+    from rateslib import Curve, add_tenor, dt
+
+    def make(valuation_date=None):
+        val = dt(2025, 1, 6) if valuation_date is None else valuation_date
+        nodes = {val: 1.0, **{add_tenor(val, t, "F", "nyc"): 1.0 for t in TERMS}}
+        return Curve(nodes=nodes, id="sofr", convention="act360", calendar="nyc", interpolation="log_linear")
+
+    return make
+
+
+@pytest.fixture
+def calibration_md():
+    """Calibration quotes as calibrate_curve takes them (decimals)."""
+    return pd.DataFrame({"Term": TERMS, "Rate": [r / 100 for r in RATES]})
+
+
+@pytest.fixture
+def live_curve(make_curve):
+    """Point curve_calibration at a fresh curve with no session or cached solves."""
+    import curve_calibration
+
+    curve = make_curve()
+    curve_calibration.sofr = curve
+    curve_calibration.valuation_date = curve.nodes.keys[0]
+    curve_calibration._session = None
+    curve_calibration.set_curve_cache()
+    return curve
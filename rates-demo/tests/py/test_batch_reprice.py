@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import batch_reprice
+import curve_calibration
+
+
+@pytest.fixture
+def book(live_curve, calibration_md):
+    curve_json = curve_calibration.calibrate_curve(calibration_md)
+    md = calibration_md.assign(Rate=calibration_md["Rate"] * 100)
+    rng = np.random.default_rng(11)
+    n = 9
+    swaps = pd.DataFrame({
+        # deliberately not sorted, so input order is distinguishable from ID order
+        "ID": [f"S{i}" for i in rng.permutation(n)],
+        "StartDate": [pd.Timestamp(2025, 3, 3) + pd.Timedelta(days=int(d)) for d in rng.integers(0, 300, n)],
+        "TerminationDate": [pd.Timestamp(2027, 3, 3) + pd.Timedelta(days=int(d)) for d in rng.integers(0, 3000, n)],
+        "Notional": rng.integers(1, 50, n) * 1e6,
+        "FixedRate": rng.uniform(3.0, 5.0, n),
+    })
+    return swaps, curve_json, md
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_reprice_book_matches_across_process_counts(book, processes):
+    swaps, curve_json, md = book
+    base_main, base_risk = batch_reprice.reprice_book(swaps, curve_json, md, chunk_size=4)
+
+    progress = []
+    main, risk = batch_reprice.reprice_book(
+        swaps, curve_json, md, chunk_size=2, processes=processes,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+
+    assert main["ID"].tolist() == swaps["ID"].tolist()
+    assert risk["ID"].tolist() == swaps["ID"].tolist()
+    pd.testing.assert_frame_equal(main, base_main, check_exact=True)
+    pd.testing.assert_frame_equal(risk, base_risk, check_exact=True)
+    done = [d for d, _ in progress]
+    assert done == sorted(done) and len(set(done)) == len(done)
+    assert done[-1] == len(swaps) and {t for _, t in progress} == {len(swaps)}
+    assert len(progress) == -(-len(swaps) // 2)
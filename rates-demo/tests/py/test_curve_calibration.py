@@ -0,0 +1,300 @@
+import asyncio
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from rateslib import Curve, Dual, add_tenor, dcf
+
+import curve_calibration
+from curve_calibration import CalibrationScheduler, CalibrationSession, CurveCache
+
+
+class FakeClock:
+    """Millisecond clock that only moves when the test advances it."""
+
+    def __init__(self):
+        self.now = 0.0
+        self._timers = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, ms):
+        fut = asyncio.get_running_loop().create_future()
+        self._timers.append((self.now + ms, fut))
+        return fut
+
+    async def advance(self, ms):
+        self.now += ms
+        due = [t for t in self._timers if t[0] <= self.now]
+        self._timers = [t for t in self._timers if t[0] > self.now]
+        for _, fut in due:
+            if not fut.done():
+                fut.set_result(None)
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+
+def _make(solve_ms):
+    clock = FakeClock()
+    running = {"now": 0, "max": 0, "calls": []}
+    published = []
+
+    async def calibrate(data):
+        running["now"] += 1
+        running["max"] = max(running["max"], running["now"])
+        running["calls"].append(data)
+        try:
+            await clock.sleep(solve_ms)
+            return data * 10
+        finally:
+            running["now"] -= 1
+
+    sched = CalibrationScheduler(
+        calibrate=calibrate,
+        publish=lambda result, data, latency: published.append((result, data, latency)),
+        clock=clock,
+    )
+    return sched, clock, running, published
+
+
+def test_fast_ticks_publish_and_latest_snapshot_wins():
+    async def scenario():
+        sched, clock, running, published = _make(solve_ms=50)
+        for i in range(100):
+            sched.submit(i)
+            await clock.advance(10)
+        for _ in range(20):
+            if not sched.busy:
+                break
+            await clock.advance(10)
+        return sched, running, published
+
+    sched, running, published = asyncio.run(scenario())
+    assert running["max"] == 1
+    # every finished solve is published, and the final tick is always solved
+    assert len(published) == sched.solves == len(running["calls"])
+    assert len(published) >= 100 * 10 // 50 - 1
+    assert published[-1][:2] == (990, 99)
+    assert [d for _, d, _ in published] == sorted(d for _, d, _ in published)
+    assert all(latency == 50 for _, _, latency in published)
+    assert sched.stats()["skipped"] + sched.solves == 100
+
+
+def test_never_more_than_one_solve_at_a_time():
+    async def scenario():
+        sched, clock, running, published = _make(solve_ms=50)
+        sched.submit(0)
+        await clock.advance(0)
+        for i in range(1, 5):
+            sched.submit(i)
+            await clock.advance(1)
+        assert running["now"] == 1 and running["calls"] == [0]
+        await clock.advance(50)
+        assert [d for _, d, _ in published] == [0]
+        assert running["calls"] == [0, 4]
+        await clock.advance(50)
+        return sched, running, published
+
+    sched, running, published = asyncio.run(scenario())
+    assert running["max"] == 1
+    assert [d for _, d, _ in published] == [0, 4]
+    assert sched.skipped == 3
+    assert not sched.busy
+
+
+def test_submits_queued_behind_a_sync_solve_coalesce_and_errors_are_reported():
+    solved, published, failed = [], [], []
+
+    def calibrate(data):
+        solved.append(data)
+        if data == "bad":
+            raise ValueError("no convergence")
+        return data.upper()
+
+    async def scenario():
+        sched = CalibrationScheduler(
+            calibrate=calibrate,
+            publish=lambda result, data, latency: published.append(result),
+            on_error=lambda error, data: failed.append((str(error), data)),
+        )
+        for data in ("a", "b", "bad"):
+            sched.submit(data)
+        await sched.drain()
+        sched.submit("c")
+        await sched.drain()
+        return sched
+
+    sched = asyncio.run(scenario())
+    assert solved == ["bad", "c"]
+    assert failed == [("no convergence", "bad")]
+    assert published == ["C"]
+    assert sched.stats()["errors"] == 1 and sched.skipped == 2
+
+
+# ---- CalibrationSession ----
+
+def _quotes(calibration_md):
+    return calibration_md["Rate"].to_numpy(dtype="float64") * 100
+
+
+def _fresh_solve(make_curve, terms, rates):
+    session = CalibrationSession(make_curve(), terms)
+    session.calibrate(rates)
+    return session
+
+
+def test_single_quote_newton_step_matches_a_fresh_solver(make_curve, calibration_md):
+    terms, base = list(calibration_md["Term"]), _quotes(calibration_md)
+    session = CalibrationSession(make_curve(), terms)
+    session.calibrate(base)
+    moved = base.copy()
+    moved[terms.index("5Y")] += 0.005  # half a bp
+
+    session.calibrate(moved)
+
+    assert (session.solves, session.newton_steps) == (1, 1)
+    assert np.max(np.abs(session._residuals())) <= session.newton_tol
+    fresh = _fresh_solve(make_curve, terms, moved)
+    np.testing.assert_allclose(session.node_values(), fresh.node_values(), rtol=0, atol=1e-6)
+
+
+def test_multi_quote_move_falls_back_to_a_full_solve(make_curve, calibration_md):
+    terms, base = list(calibration_md["Term"]), _quotes(calibration_md)
+    session = CalibrationSession(make_curve(), terms)
+    session.calibrate(base)
+    moved = base.copy()
+    moved[[terms.index("2Y"), terms.index("10Y")]] += 0.01
+
+    session.calibrate(moved)
+
+    assert (session.solves, session.newton_steps) == (2, 0)
+    fresh = _fresh_solve(make_curve, terms, moved)
+    # warm and cold starts stop at different iterates inside the solver tolerance
+    np.testing.assert_allclose(session.node_values(), fresh.node_values(), rtol=0, atol=1e-6)
+
+
+def test_newton_updated_nodes_stay_solver_parameters(make_curve, calibration_md):
+    terms, base = list(calibration_md["Term"]), _quotes(calibration_md)
+    session = CalibrationSession(make_curve(), terms)
+    session.calibrate(base)
+    solved = {k: session.curve[k] for k in session.curve.nodes.keys[1:]}
+    nudged = base.copy()
+    nudged[terms.index("1Y")] += 0.002
+    session.calibrate(nudged)
+    assert session.newton_steps == 1
+    for key, before in solved.items():
+        node = session.curve[key]
+        assert isinstance(node, Dual) and node.vars == before.vars
+        np.testing.assert_allclose(node.dual, before.dual, rtol=0, atol=1e-12)
+
+    shifted = base + 0.25
+    session.calibrate(shifted)
+
+    assert session.solves == 2
+    assert np.max(np.abs(session._residuals())) < 1e-6  # percent, i.e. 1e-4 bp
+    fresh = _fresh_solve(make_curve, terms, shifted)
+    np.testing.assert_allclose(session.node_values(), fresh.node_values(), rtol=0, atol=1e-6)
+    # a Jacobian that lost its parameters would come back all zero
+    np.testing.assert_allclose(session.grad_s_vT, fresh.grad_s_vT, rtol=1e-4, atol=1e-6)
+
+
+# ---- CurveCache ----
+
+def test_quantized_cache_hit_restores_nodes_without_a_solve(live_curve, calibration_md, monkeypatch):
+    first_json = curve_calibration.calibrate_curve(calibration_md)
+    first_nodes = curve_calibration._session.node_values()
+    moved = calibration_md.assign(Rate=calibration_md["Rate"] + 0.0002)
+    curve_calibration.calibrate_curve(moved)
+    assert not np.allclose(curve_calibration._session.node_values(), first_nodes)
+
+    def no_solve(*args, **kwargs):
+        raise AssertionError("a cache hit must not solve")
+
+    monkeypatch.setattr(CalibrationSession, "calibrate", no_solve)
+    monkeypatch.setattr(CalibrationSession, "_solve", no_solve)
+    # well inside the 0.01bp bucket of the first quotes
+    jittered = calibration_md.assign(Rate=calibration_md["Rate"] + 1e-9)
+
+    assert curve_calibration.calibrate_curve(jittered) is first_json
+    assert curve_calibration.sofr_json is first_json
+    np.testing.assert_array_equal(curve_calibration._session.node_values(), first_nodes)
+    stats = curve_calibration.get_curve_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 2, 2)
+
+
+def test_curve_cache_evicts_least_recently_used_and_counts():
+    cache = CurveCache(maxsize=2, tolerance_bp=0.01)
+    keys = [cache.key("d", ["1Y"], np.array([r])) for r in (4.0, 4.1, 4.2)]
+    assert cache.key("d", ["1Y"], np.array([4.00004])) == keys[0]
+    assert cache.key("d", ["1Y"], np.array([4.0001])) != keys[0]
+
+    cache.put(keys[0], {"json": "a"})
+    cache.put(keys[1], {"json": "b"})
+    assert cache.get(keys[0])["json"] == "a"  # now most recent
+    cache.put(keys[2], {"json": "c"})
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2])["json"] == "c"
+    assert cache.stats() == {
+        "size": 2,
+        "maxsize": 2,
+        "tolerance_bp": 0.01,
+        "hits": 2,
+        "misses": 1,
+        "evictions": 1,
+        "hit_rate": 2 / 3,
+    }
+    with pytest.raises(ValueError):
+        CurveCache(maxsize=0)
+
+
+def test_set_curve_from_json_drops_cached_solves(live_curve, calibration_md):
+    json_str = curve_calibration.calibrate_curve(calibration_md)
+    assert curve_calibration._cache_entry is not None
+    assert curve_calibration.get_curve_cache_stats()["size"] == 1
+
+    curve_calibration.set_curve_from_json(json_str)
+
+    assert curve_calibration._cache_entry is None
+    assert curve_calibration.get_curve_cache_stats()["size"] == 0
+
+
+# ---- display curves ----
+
+def _old_display_curves():
+    # the per-tenor loops sample_curve replaced
+    sofr, val = curve_calibration.sofr, curve_calibration.valuation_date
+    maturities = [add_tenor(val, t, "F", "nyc") for t in curve_calibration.display_terms]
+    return pd.DataFrame({
+        "df": [float(sofr[m]) for m in maturities],
+        "zero_rate": [100 * np.log(sofr[m].real) / -dcf(val, m, "act360") for m in maturities],
+        "forward_rate": [float(sofr.rate(m - timedelta(days=1), m)) for m in maturities],
+        "days": [(m - val).days for m in maturities],
+    }, index=pd.Index(curve_calibration.display_terms, name="term"))
+
+
+def test_display_getters_match_the_per_tenor_loops(live_curve, calibration_md):
+    curve_calibration.calibrate_curve(calibration_md)
+    old = _old_display_curves()
+
+    for getter, cols in (
+        (curve_calibration.get_discount_factor_curve, ["df"]),
+        (curve_calibration.get_zero_rate_curve, ["zero_rate"]),
+        (curve_calibration.get_forward_rate_curve, ["forward_rate", "days"]),
+    ):
+        pd.testing.assert_frame_equal(getter(), old[cols], check_exact=False, rtol=1e-10, atol=1e-12, check_dtype=False)
+
+
+def test_forwards_use_the_curve_convention(live_curve):
+    val = live_curve.nodes.keys[0]
+    nodes = {val: 1.0, add_tenor(val, "1Y", "F", "nyc"): 0.96, add_tenor(val, "50Y", "F", "nyc"): 0.2}
+    curve_calibration.sofr = Curve(nodes=nodes, id="sofr", convention="act365f", calendar="nyc", interpolation="log_linear")
+
+    old = _old_display_curves()
+
+    forward = curve_calibration.sample_curve()["forward_rate"].to_numpy()
+    np.testing.assert_allclose(forward, old["forward_rate"], rtol=1e-10)
+    # what a hardcoded act360 day count would have produced
+    assert not np.allclose(forward, old["forward_rate"] * 360 / 365, rtol=1e-4)
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import datafeed
+
+ROWS = [
+    {"Term": "1M", "Rate": 4.30},
+    {"Term": "1Y", "Rate": 4.00},
+    {"Term": "2Y", "Rate": 3.80},
+    {"Term": "5Y", "Rate": 3.70},
+    {"Term": "10Y", "Rate": 3.90},
+]
+
+
+class ScriptedRng:
+    """Hands out the same factor/local normals to simulate_tick (one at a time) and simulate_path (in bulk)."""
+
+    def __init__(self, factor, local):
+        self._bulk = [list(factor), list(local)]
+        self._scalar = [list(factor), list(local)]
+        self._calls = 0
+
+    def normal(self, loc, scale, size=None):
+        if size is not None:
+            return np.array(self._bulk.pop(0)[:size], dtype="float64")
+        draws = self._scalar[self._calls % 2]
+        self._calls += 1
+        return draws.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def feed():
+    datafeed.set_source_from_rows(ROWS)
+    yield
+    datafeed.clear_replay_source()
+    datafeed._rng = np.random.default_rng()
+
+
+def test_zero_steps_is_an_empty_path():
+    before = datafeed.get_datafeed()
+    assert datafeed.simulate_path(0, mean_revert=0.0).shape == (0, len(ROWS))
+    assert datafeed.simulate_path(0, events=True).size == 0
+    assert datafeed.get_datafeed().equals(before)
+    assert datafeed._global_factor == 0.0
+
+
+def test_seed_makes_paths_reproducible():
+    a = datafeed.simulate_path(50, seed=7, advance=False)
+    b = datafeed.simulate_path(50, seed=7, advance=False)
+    c = datafeed.simulate_path(50, seed=8, advance=False)
+    np.testing.assert_array_equal(a, b)
+    assert not np.array_equal(a, c)
+    ev = datafeed.simulate_path(50, seed=7, events=True, advance=False)
+    np.testing.assert_array_equal(a[ev["step"], ev["tenor"]], ev["rate"])
+
+
+@pytest.mark.parametrize("mean_revert", [0.0, 0.02, 0.5])
+def test_path_matches_simulate_tick(mean_revert):
+    rng = np.random.default_rng(3)
+    terms = ["1M", "2Y", "10Y", "2Y", "5Y", "1Y", "1M", "10Y"]
+    factor, local = rng.normal(0.0, 1.0, len(terms)), rng.normal(0.0, 1.0, len(terms))
+    # wide shocks so the neighbour clipping binds on most steps
+    kw = dict(rho=0.7, sigma_bps=40.0, mean_revert=mean_revert, margin_bps=5.0)
+
+    datafeed._rng = ScriptedRng(factor, local)
+    path = datafeed.simulate_path(len(terms), terms=terms, **kw)
+    path_factor = datafeed._global_factor
+
+    datafeed.reset_datafeed()
+    datafeed._rng = ScriptedRng(factor, local)
+    ticks = []
+    for term in terms:
+        datafeed.simulate_tick(term=term, **kw)
+        ticks.append(datafeed.get_datafeed()["Rate"].to_numpy())
+
+    np.testing.assert_allclose(path, np.array(ticks), rtol=0, atol=1e-12)
+    assert path_factor == pytest.approx(datafeed._global_factor, rel=1e-12)
+
+
+def test_reset_rewinds_a_replay_to_its_start(tmp_path):
+    t = pd.Timestamp("2025-01-06 14:00")
+    moves = [(0, r["Term"], r["Rate"]) for r in ROWS] + [(1, "1Y", 4.05), (2, "5Y", 3.60), (2, "10Y", 3.95), (3, "2Y", 3.85)]
+    quotes = pd.DataFrame([{"Term": term, "Rate": rate, "quote_time": t + pd.Timedelta(seconds=s), "curve_id": "sofr"} for s, term, rate in moves])
+    datafeed.write_history_store(str(tmp_path), quotes)
+    datafeed.set_replay_source(str(tmp_path), start=t + pd.Timedelta(seconds=1))
+    seed = datafeed.get_datafeed()
+    assert seed.loc["1Y", "Rate"] == pytest.approx(0.0405)
+
+    first = [datafeed.get_updated_datafeed() for _ in range(2)]
+    datafeed.reset_datafeed()
+
+    pd.testing.assert_frame_equal(datafeed.get_datafeed(), seed)
+    assert len(datafeed.get_tick_history()) == 0
+    again = [datafeed.get_updated_datafeed() for _ in range(2)]
+    for a, b in zip(first, again):
+        pd.testing.assert_frame_equal(a, b)
+    assert again[-1].loc["2Y", "Rate"] == pytest.approx(0.0385)
+
+
+class NaiveHistory:
+    """Unbounded reference for TickHistory: keeps every event and replays from the start."""
+
+    def __init__(self, rates):
+        self.initial = np.array(rates, dtype="float64")
+        self.ts, self.tenor, self.rate = [], [], []
+
+    def add(self, ts, tenors, rates):
+        self.ts += list(np.broadcast_to(ts, np.shape(tenors)))
+        self.tenor += list(tenors)
+        self.rate += list(rates)
+
+    def snapshot(self, step):
+        curve = self.initial.copy()
+        for i in range(step + 1):
+            curve[self.tenor[i]] = self.rate[i]
+        return curve
+
+    def changes(self, first):
+        return np.array([self.rate[i] - self.snapshot(i - 1)[self.tenor[i]] for i in range(first, len(self.rate))])
+
+
+def test_tick_history_matches_an_unbounded_replay():
+    rng = np.random.default_rng(5)
+    initial = rng.uniform(0.03, 0.05, len(ROWS))
+    history = datafeed.TickHistory([r["Term"] for r in ROWS], initial, capacity=8)
+    naive = NaiveHistory(initial)
+    ts = 0.0
+    # single records, batches that evict, and one batch larger than the ring (spill)
+    for k in (1, 3, 1, 5, 2, 1, 13, 4, 0, 6):
+        tenors = rng.integers(0, len(ROWS), k)
+        rates = rng.uniform(0.03, 0.05, k)
+        if k == 1:
+            history.record(ts, int(tenors[0]), float(rates[0]))
+        else:
+            history.record_many(ts, tenors, rates)
+        naive.add(ts, tenors, rates)
+        ts += 1.0
+
+        total = len(naive.rate)
+        assert len(history) == min(total, 8)
+        assert (history.first_step, history.last_step) == (total - len(history), total - 1)
+        for step in range(history.first_step - 1, total):
+            np.testing.assert_array_equal(history.snapshot(step), naive.snapshot(step))
+        changes = naive.changes(history.first_step)
+        np.testing.assert_allclose(history.changes(), changes, rtol=0, atol=1e-15)
+        ev = history.events()
+        np.testing.assert_array_equal(ev["step"], np.arange(history.first_step, total))
+        np.testing.assert_array_equal(ev["tenor"], naive.tenor[history.first_step:])
+
+        tenor = np.array(naive.tenor[history.first_step:])
+        stamps = np.array(naive.ts[history.first_step:])
+        recent = stamps >= stamps[-1] - 1.0
+        for vol, keep in (
+            (history.realized_vol(), np.ones(len(tenor), dtype=bool)),
+            (history.realized_vol(window=1.0), recent),
+            (history.realized_vol(last_n=3), np.arange(len(tenor)) >= len(tenor) - 3),
+        ):
+            expected = np.sqrt(np.bincount(tenor[keep], weights=changes[keep] ** 2, minlength=len(ROWS)))
+            np.testing.assert_allclose(vol, expected, rtol=1e-12, atol=1e-15)
+
+    with pytest.raises(IndexError):
+        history.snapshot(history.first_step - 2)
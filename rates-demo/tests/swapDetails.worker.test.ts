@@ -0,0 +1,160 @@
+import { afterEach, describe, expect, it, vi } from "vitest";
+import { decodeFlows, NAT_DAY, type FlowScheduleCache } from "@/lib/flowColumns";
+
+const market = [{ Term: "1Y", Rate: 0.02 }];
+
+// minimal stand-ins for the PyProxy objects get_columnar_flows returns
+const ndarray = (data: Float64Array | Int32Array) => ({
+  type: "numpy.ndarray",
+  getBuffer: () => ({ data, release: vi.fn() }),
+  destroy: vi.fn(),
+});
+const pyList = (items: Array<string | undefined>) => ({ toJs: () => items, destroy: vi.fn() });
+const pyDict = (entries: Record<string, any>) => ({
+  [Symbol.iterator]: function* () {
+    yield* Object.keys(entries);
+  },
+  has: (key: string) => key in entries,
+  get: (key: string) => entries[key],
+  destroy: vi.fn(),
+});
+
+describe("swapDetails.worker flows", () => {
+  let messages: Array<{ msg: any; transfer: any[] }> = [];
+  let onmessage: ((ev: any) => any) | null = null;
+  let flowCalls: Array<{ leg: string; force: boolean }> = [];
+  let schedules: Record<string, number>;
+  let emitted: Record<string, number>;
+  let globalsSet: ReturnType<typeof vi.fn>;
+  let runPython: ReturnType<typeof vi.fn>;
+
+  const columnar = (leg: string, force: boolean) => {
+    const schedule = schedules[leg];
+    const entries: Record<string, any> = {
+      leg,
+      schedule,
+      n: 2,
+      values: pyDict({ NPV: ndarray(new Float64Array([1.5, Number.NaN])) }),
+    };
+    if (force || emitted[leg] !== schedule) {
+      entries.schema = {
+        toJs: () => [
+          { name: "Period", kind: "text", dynamic: false },
+          { name: "Payment Date", kind: "date", dynamic: false },
+          { name: "NPV", kind: "float", dynamic: true },
+        ],
+        destroy: vi.fn(),
+      };
+      entries.static = pyDict({
+        Period: pyList(["Regular", undefined]),
+        "Payment Date": ndarray(new Int32Array([20517, NAT_DAY])),
+      });
+      emitted[leg] = schedule;
+    }
+    return pyDict(entries);
+  };
+
+  const setupWorker = async (context: Record<string, unknown> = {}) => {
+    vi.resetModules();
+    messages = [];
+    flowCalls = [];
+    schedules = { fixed: 1, float: 2 };
+    emitted = {};
+    globalsSet = vi.fn();
+    runPython = vi.fn((code: string) => {
+      const flows = code.match(/get_columnar_flows\('(\w+)', _flows_md, (True|False)\)/);
+      if (flows) {
+        flowCalls.push({ leg: flows[1], force: flows[2] === "True" });
+        return columnar(flows[1], flows[2] === "True");
+      }
+      if (code.includes("set_swap_context")) return JSON.stringify({});
+      if (code.includes("get_swap_risk")) return JSON.stringify({ c_1Y: 1 });
+      if (code.includes("get_current_swap_price")) return JSON.stringify({ NPV: 1, ParRate: 2 });
+      return undefined;
+    });
+    const pyodide = {
+      loadPackage: vi.fn(async () => {}),
+      runPython,
+      runPythonAsync: vi.fn(async () => {}),
+      globals: { set: globalsSet },
+    };
+    vi.stubGlobal("fetch", vi.fn(async () => new Response("# swap details", { status: 200 })));
+    vi.stubGlobal("self", {
+      importScripts: vi.fn(),
+      loadPyodide: vi.fn(async () => pyodide),
+      postMessage: (msg: any, transfer: any[] = []) => messages.push({ msg, transfer }),
+    } as any);
+
+    await import("@/workers/swapDetails.worker");
+    onmessage = (self as any).onmessage;
+    await onmessage?.({ data: { type: "init" } } as any);
+    await onmessage?.({ data: { type: "context", swapId: "S1", swap: { ID: "S1" }, market, ...context } } as any);
+  };
+
+  const flowMessages = (type: string) => messages.filter((m) => m.msg.type === type);
+
+  afterEach(() => {
+    vi.unstubAllGlobals();
+    vi.resetModules();
+  });
+
+  it("sends static columns once per schedule and transfers the value arrays", async () => {
+    await setupWorker();
+    const cache: FlowScheduleCache = {};
+
+    const [first] = flowMessages("fixed_flows");
+    expect(flowCalls[0]).toEqual({ leg: "fixed", force: true });
+    expect(first.msg.flows.schema).toHaveLength(3);
+    expect(first.transfer).toContain(first.msg.flows.values.NPV.buffer);
+    expect(decodeFlows(cache, "fixed", first.msg.flows)).toEqual([
+      { Period: "Regular", "Payment Date": "2026-03-05", NPV: 1.5 },
+      { Period: null, "Payment Date": null, NPV: null },
+    ]);
+
+    messages = [];
+    flowCalls = [];
+    await onmessage?.({ data: { type: "fixedFlows", swapId: "S1", market } } as any);
+    const [tick] = flowMessages("fixed_flows");
+    expect(flowCalls).toEqual([{ leg: "fixed", force: false }, { leg: "float", force: false }]);
+    expect(tick.msg.flows.schema).toBeUndefined();
+    expect(tick.msg.flows.static).toBeUndefined();
+    expect(decodeFlows(cache, "fixed", tick.msg.flows)?.[0]).toEqual({ Period: "Regular", "Payment Date": "2026-03-05", NPV: 1.5 });
+  });
+
+  it("reruns with forced static columns when Python already emitted an unseen schedule", async () => {
+    await setupWorker();
+    const cache: FlowScheduleCache = {};
+    decodeFlows(cache, "fixed", flowMessages("fixed_flows")[0].msg.flows);
+
+    // e.g. a rebuild whose static payload never reached the page
+    schedules.fixed = 7;
+    emitted.fixed = 7;
+    messages = [];
+    flowCalls = [];
+    await onmessage?.({ data: { type: "fixedFlows", swapId: "S1", market } } as any);
+
+    expect(flowCalls.filter((c) => c.leg === "fixed")).toEqual([
+      { leg: "fixed", force: false },
+      { leg: "fixed", force: true },
+    ]);
+    const [msg] = flowMessages("fixed_flows");
+    expect(msg.msg.flows.schedule).toBe(7);
+    expect(msg.msg.flows.schema).toHaveLength(3);
+    const rows = decodeFlows(cache, "fixed", msg.msg.flows);
+    expect(rows?.[1]).toEqual({ Period: null, "Payment Date": null, NPV: null });
+    expect(cache.fixed?.schedule).toBe(7);
+  });
+
+  it("hands the calibration jacobian to set_swap_context", async () => {
+    const jacobian = new Uint8Array([83, 66, 74, 49]);
+    await setupWorker({ curveJson: "CURVE", jacobian });
+
+    expect(globalsSet).toHaveBeenCalledWith("swap_context_jacobian", jacobian);
+    expect(runPython).toHaveBeenCalledWith(expect.stringContaining("set_swap_context(swap_row, swap_curve_json, cal_md, jac)"));
+  });
+
+  it("refuses to decode values for a schedule the page never received", () => {
+    const cache: FlowScheduleCache = {};
+    expect(decodeFlows(cache, "float", { schedule: 3, n: 1, values: { NPV: new Float64Array([1]) } })).toBeNull();
+  });
+});